@@ -1,168 +1,464 @@
 import math
+import time
+import numpy as np
 import mlx.core as mx
+import mlx.optimizers as optim
+from transposition import TranspositionTable
+from evaluation_cache import EvaluationCache
+from mcts_tree import MCTSTree
+from chess_board import ChessBoard, NUM_PLANES
+from move_encoding import NUM_MOVES, move_index, index_move
 
 def manual_conv2d(x, weight, bias):
-    batch, in_channels, height, width = x.shape
-    out_channels, in_channels, kernel_height, kernel_width = weight.shape
-
-    padded_x = mx.pad(x, ((0, 0), (0, 0), (1, 1), (1, 1)), mode='constant')
-
-    output = mx.zeros((batch, out_channels, height, width))
-
-    for i in range(height):
-        for j in range(width):
-            patch = padded_x[:, :, i:i+kernel_height, j:j+kernel_width]
-            for c in range(out_channels):
-                output[:, c, i, j] = mx.sum(patch * weight[c], axis=(1, 2, 3))
-
-    return output + bias.reshape(1, -1, 1, 1)
+    # Channels-last, as mx.conv2d wants: x is (batch, height, width, in_channels)
+    # and weight is (out_channels, kernel_height, kernel_width, in_channels)
+    kernel_height, kernel_width = weight.shape[1:3]
+    return mx.conv2d(x, weight, padding=(kernel_height // 2, kernel_width // 2)) + bias
 
 def manual_linear(x, weight, bias):
     return mx.matmul(x, weight.T) + bias
 
+def dequantize(parameters):
+    # Weights of a quantize.py checkpoint back to float32: int8 weights come with a
+    # per-output-channel "<name>_scale", float16 ones are only cast. Float32 passes through.
+    weights = {}
+    for name, value in parameters.items():
+        if name.endswith("_scale"):
+            continue
+        if value.dtype == mx.int8:
+            scale = parameters[name + "_scale"]
+            value = value.astype(mx.float32) * scale.reshape((-1,) + (1,) * (value.ndim - 1))
+        elif value.dtype == mx.float16:
+            value = value.astype(mx.float32)
+        weights[name] = value
+    return weights
+
+def he_normal(shape, fan_in):
+    return mx.random.normal(shape) * math.sqrt(2 / fan_in)
+
 class ChessNet:
-    def __init__(self):
+    # Residual tower: a 3x3 stem, `blocks` residual blocks of two 3x3 convolutions,
+    # all `channels` wide on the 10x9 board. The policy head is a 1x1 convolution
+    # into a linear layer over the dense move index; the value head pools globally.
+    def __init__(self, channels=48, blocks=4, policy_channels=2, value_hidden=64):
+        self.channels = channels
+        self.blocks = blocks
+        self.policy_channels = policy_channels
+        self.value_hidden = value_hidden
+
         # 卷積層權重和偏置
-        self.conv1_weight = mx.random.normal((32, 1, 3, 3))
-        self.conv1_bias = mx.zeros((32,))
-        self.conv2_weight = mx.random.normal((64, 32, 3, 3))
-        self.conv2_bias = mx.zeros((64,))
-        self.conv3_weight = mx.random.normal((128, 64, 3, 3))
-        self.conv3_bias = mx.zeros((128,))
-
-        # 全連接層權重和偏置
-        self.fc1_weight = mx.random.normal((512, 128 * 9 * 90))
-        self.fc1_bias = mx.zeros((512,))
-        self.fc2_weight = mx.random.normal((256, 512))
-        self.fc2_bias = mx.zeros((256,))
-        self.policy_head_weight = mx.random.normal((9 * 10 * 9 * 10, 256))
-        self.policy_head_bias = mx.zeros((9 * 10 * 9 * 10,))
-        self.value_head_weight = mx.random.normal((1, 256))
+        self.stem_weight = he_normal((channels, 3, 3, NUM_PLANES), 9 * NUM_PLANES)
+        self.stem_bias = mx.zeros((channels,))
+        for block in range(blocks):
+            setattr(self, f"block{block}_conv1_weight", he_normal((channels, 3, 3, channels), 9 * channels))
+            setattr(self, f"block{block}_conv1_bias", mx.zeros((channels,)))
+            # Zero, so every block starts out as the identity
+            setattr(self, f"block{block}_conv2_weight", mx.zeros((channels, 3, 3, channels)))
+            setattr(self, f"block{block}_conv2_bias", mx.zeros((channels,)))
+
+        # 策略頭和價值頭
+        self.policy_conv_weight = he_normal((policy_channels, 1, 1, channels), channels)
+        self.policy_conv_bias = mx.zeros((policy_channels,))
+        self.policy_head_weight = mx.random.normal((NUM_MOVES, policy_channels * 90)) / math.sqrt(policy_channels * 90)
+        self.policy_head_bias = mx.zeros((NUM_MOVES,))
+        self.value_fc_weight = he_normal((value_hidden, channels), channels)
+        self.value_fc_bias = mx.zeros((value_hidden,))
+        self.value_head_weight = mx.random.normal((1, value_hidden)) / math.sqrt(value_hidden)
         self.value_head_bias = mx.zeros((1,))
+        # Compiled on first use; mx.compile keeps one trace per input shape
+        self.compiled_predict = None
+
+    @classmethod
+    def load(cls, path):
+        # Builds a network shaped like the checkpoint's weights and loads them
+        weights = mx.load(path)
+        blocks = sum(1 for name in weights if name.startswith("block") and name.endswith("_conv1_weight"))
+        model = cls(channels=weights["stem_weight"].shape[0], blocks=blocks,
+                    policy_channels=weights["policy_conv_weight"].shape[0],
+                    value_hidden=weights["value_fc_weight"].shape[0])
+        model.update(weights)
+        return model
 
     def __call__(self, x):
-        x = x.reshape(-1, 1, 9, 90)
-        x = manual_conv2d(x, self.conv1_weight, self.conv1_bias)
-        x = mx.maximum(x, 0)
-        x = manual_conv2d(x, self.conv2_weight, self.conv2_bias)
-        x = mx.maximum(x, 0)
-        x = manual_conv2d(x, self.conv3_weight, self.conv3_bias)
-        x = mx.maximum(x, 0)
-        x = x.reshape(-1, 128 * 9 * 90)
-        x = manual_linear(x, self.fc1_weight, self.fc1_bias)
-        x = mx.maximum(x, 0)
-        x = manual_linear(x, self.fc2_weight, self.fc2_bias)
-        x = mx.maximum(x, 0)
-        policy = manual_linear(x, self.policy_head_weight, self.policy_head_bias)
-        value = mx.tanh(manual_linear(x, self.value_head_weight, self.value_head_bias))
+        return self.forward(self.parameters(), x)
+
+    def forward(self, parameters, x):
+        # (batch, NUM_PLANES, 10, 9) planes -> (batch, NUM_MOVES) logits and (batch, 1) values.
+        # Reads the weights from `parameters` so traced and differentiated calls can pass them in.
+        p = dequantize(parameters)
+        x = mx.transpose(x.reshape(-1, NUM_PLANES, 10, 9), (0, 2, 3, 1))
+        x = mx.maximum(manual_conv2d(x, p["stem_weight"], p["stem_bias"]), 0)
+        for block in range(self.blocks):
+            residual = mx.maximum(manual_conv2d(x, p[f"block{block}_conv1_weight"], p[f"block{block}_conv1_bias"]), 0)
+            residual = manual_conv2d(residual, p[f"block{block}_conv2_weight"], p[f"block{block}_conv2_bias"])
+            x = mx.maximum(x + residual, 0)
+
+        policy = mx.maximum(manual_conv2d(x, p["policy_conv_weight"], p["policy_conv_bias"]), 0)
+        policy = manual_linear(policy.reshape(-1, self.policy_channels * 90), p["policy_head_weight"],
+                               p["policy_head_bias"])
+        value = mx.maximum(manual_linear(mx.mean(x, axis=(1, 2)), p["value_fc_weight"], p["value_fc_bias"]), 0)
+        value = mx.tanh(manual_linear(value, p["value_head_weight"], p["value_head_bias"]))
 
         return policy, value
 
-class MCTSNode:
-    def __init__(self, state, parent=None, action=None):
-        self.state = state
-        self.parent = parent
-        self.action = action
-        self.children = []
-        self.visits = 0
-        self.value = 0
+    def masked_forward(self, parameters, x, legal_mask):
+        logits, value = self.forward(parameters, x)
+        priors = mx.softmax(mx.where(legal_mask, logits, -mx.inf), axis=-1)
+        return priors, value
+
+    def predict(self, x, legal_mask):
+        # Inference entry point for search: one compiled graph per batch shape that
+        # returns (batch, NUM_MOVES) priors already softmaxed over the moves in the
+        # boolean `legal_mask`, and (batch, 1) values. Nothing here records gradients.
+        if self.compiled_predict is None:
+            self.compiled_predict = mx.compile(self.masked_forward)
+        return self.compiled_predict(self.parameters(), x, legal_mask)
+
+    def parameters(self):
+        return {name: value for name, value in vars(self).items() if isinstance(value, mx.array)}
+
+    def parameter_count(self):
+        return sum(value.size for value in self.parameters().values())
+
+    def update(self, parameters):
+        for name, value in parameters.items():
+            setattr(self, name, value)
+
+MAX_LEGAL_MOVES = 256  # Comfortably above the most moves a xiangqi position allows
+DEFAULT = object()  # Per-call budget not given: use the one set on the MCTS
 
 class MCTS:
-    def __init__(self, model, num_simulations=800, c_puct=1.0):
+    def __init__(self, model, num_simulations=800, c_puct=1.0, transposition_table=None, batch_size=8,
+                 virtual_loss=1.0, evaluation_cache=None, max_nodes=1 << 20, time_limit=None, early_stop=False,
+                 verbose=True):
         self.model = model
+        self.verbose = verbose
+        # Per-move budgets: simulations and/or seconds; None leaves that limit off
         self.num_simulations = num_simulations
+        self.time_limit = time_limit
+        # Stop once the most visited move can no longer be overtaken
+        self.early_stop = early_stop
+        self.last_search = {}
+        # Root children as (policy indices, visit counts) after the last search
+        self.last_visits = ([], [])
         self.c_puct = c_puct
+        # Kept between moves; get_action promotes the node for the new position to root
+        self.tree = MCTSTree(max_nodes)
+        # Expanded node index in self.tree by position key, so transpositions share one
+        # child block. Indices only make sense for this search, do not share the table.
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+        # Leaves collected per network call; virtual loss steers the paths in one batch apart
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        # Network results by position; pass the same cache to searches sharing weights
+        self.evaluation_cache = evaluation_cache if evaluation_cache is not None else EvaluationCache()
 
-    def get_action(self, state, legal_moves, player_color):
-        root = MCTSNode(state)
+    def get_action(self, board, player_color, num_simulations=DEFAULT, time_limit=DEFAULT):
+        best_action = run_search(self.model, self.search(board, player_color, num_simulations, time_limit))
+        if self.verbose and best_action is not None:
+            print_move(player_color, best_action)
+        return best_action
 
-        for _ in range(self.num_simulations):
-            node = root
-            search_path = [node]
+    def search(self, board, player_color, num_simulations=DEFAULT, time_limit=DEFAULT):
+        # Anytime search: stops at whichever budget runs out first, checked after each
+        # batch, and returns the most visited move so far (None from a finished position).
+        # Generator: yields each batch of leaves that needs the network and expects
+        # evaluate_batch's (priors, values) for it back through send(), so a
+        # scheduler can pool the leaves of many searches into one forward pass.
+        # An explicit None turns that limit off for this call
+        num_simulations = self.num_simulations if num_simulations is DEFAULT else num_simulations
+        time_limit = self.time_limit if time_limit is DEFAULT else time_limit
+        if num_simulations is None and time_limit is None:
+            raise ValueError("MCTS needs a simulation budget, a time limit or both")
+        start_time = time.perf_counter()
+        deadline = start_time + time_limit if time_limit is not None else None
 
-            while node.children:
-                node = self.select_child(node)
-                search_path.append(node)
+        self.transposition_table.new_search()
+        root = self.get_root(board.position_key(player_color))
 
-            # 确保输入形状正确
-            model_input = mx.array(node.state)
+        simulations = 0
+        stop_reason = "simulations"
+        if board.generals[player_color] is None or not board.has_legal_move(player_color):
+            # Finished position: nothing to search, and no leaf would ever reach the network
+            stop_reason = "terminal"
+            num_simulations = 0
+        while num_simulations is None or simulations < num_simulations:
+            pending = []
+            while len(pending) < self.batch_size and (num_simulations is None or simulations < num_simulations):
+                leaf = self.select_leaf(root, board, player_color)
+                if leaf is not None and any(leaf[0][-1] == other[0][-1] for other in pending):
+                    # Same leaf twice: virtual loss could not divert this path, evaluate what we have
+                    self.remove_virtual_loss(leaf[0])
+                    break
+                simulations += 1
+                if leaf is not None:
+                    pending.append(leaf)
+                elif deadline is not None and time.perf_counter() >= deadline:
+                    break  # Leaves resolved without the network can run past the deadline
+            if pending:
+                priors, values = yield pending
+                self.backup_leaves(pending, priors, values)
 
-            # 检查输入形状并进行必要的调整
-            if model_input.shape == (9, 9, 10):
-                # 如果输入形状为 (9, 9, 10)，添加一个通道维度使其变为 (9, 9, 10, 1)
-                model_input = mx.expand_dims(model_input, axis=-1)
-                # 然后转置为 (1, 1, 9, 90)，这样可以被解释为一个 9x90 的单通道输入
-                model_input = mx.transpose(model_input, (3, 2, 0, 1))
-                model_input = mx.reshape(model_input, (1, 1, 9, 90))
-            else:
-                raise ValueError(f"Unexpected input shape: {model_input.shape}. Expected (9, 9, 10).")
+            if num_simulations is not None and simulations >= num_simulations:
+                break  # Budget used up; stop_reason stays "simulations"
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                stop_reason = "time"
+                break
+            if self.early_stop:
+                remaining = num_simulations - simulations if num_simulations is not None else float('inf')
+                if deadline is not None:
+                    # Simulations that still fit in the time left at the current rate
+                    rate = simulations / max(now - start_time, 1e-9)
+                    remaining = min(remaining, rate * (deadline - now))
+                if self.is_decided(root, remaining):
+                    stop_reason = "decided"
+                    break
 
-            policy, value = self.model(model_input)
-            policy = mx.reshape(policy, (9, 10, 9, 10))
-            value = value.item()
+        self.last_search = {
+            "simulations": simulations,
+            "seconds": time.perf_counter() - start_time,
+            "stop_reason": stop_reason,
+            "tree_nodes": self.tree.size,
+        }
 
-            self.expand(node, policy, legal_moves)
-            self.backpropagate(search_path, value)
+        tree = self.tree
+        children = tree.children(root)
+        self.last_visits = (tree.move[children.start:children.stop].tolist(),
+                            tree.visits[children.start:children.stop].tolist())
+        if not children:
+            return None
+        best_child = max(children, key=lambda child: tree.visits[child])
+        return policy_move(int(tree.move[best_child]))
 
-        best_action = max(root.children, key=lambda c: c.visits).action
-        print_move(player_color, best_action)
-        return best_action
+    def is_decided(self, root, remaining):
+        tree = self.tree
+        start = int(tree.first_child[root])
+        if start < 0:
+            return False
+        visits = tree.visits[start:start + int(tree.num_children[root])]
+        if len(visits) < 2:
+            return True
+        second, best = np.partition(visits, len(visits) - 2)[-2:]
+        return best - second > remaining
+
+    def get_root(self, key):
+        # Reuse the subtree already searched for this position (normally a grandchild
+        # of the previous root, after our move and the reply) and free the rest.
+        tree = self.tree
+        node = self.transposition_table.probe(key) if tree.size else None
+        if node is not None and tree.key[node] == key:
+            tree.retain_subtree(node)
+            self.transposition_table.clear()
+            for expanded in tree.expanded_nodes().tolist():
+                self.transposition_table.store(int(tree.key[expanded]), expanded)
+            if tree.can_expand(MAX_LEGAL_MOVES):
+                return 0
+        self.reset()
+        return tree.add_root(key)
+
+    def reset(self):
+        # Drop the whole tree, e.g. when a new game starts
+        self.tree.clear()
+        self.transposition_table.clear()
+
+    def select_leaf(self, root, board, player_color):
+        # Walks down to an unexpanded node under virtual loss. Terminal leaves are
+        # backed up at once and give None; otherwise returns the data to evaluate.
+        tree = self.tree
+        node = root
+        color = player_color
+        search_path = [node]
+        path_keys = {int(tree.key[node])}
+        depth = 0
+        value = None
+
+        while tree.first_child[node] != -1:
+            child = self.select_child(node)
+            board.push(policy_move(int(tree.move[child])))
+            depth += 1
+            color = "black" if color == "red" else "red"
+            key = board.position_key(color)
+            tree.key[child] = key
+            node = child
+            search_path.append(node)
+            tree.visits[node] += 1
+            tree.value_sum[node] += self.virtual_loss
+            if key in path_keys:
+                # Repetition inside the path: the repeating child is a drawn leaf, so it
+                # collects visits and select_child does not pick it forever
+                value = 0.0
+                break
+            path_keys.add(key)
+
+        if value is None:
+            value = self.expand_known(node, board, color)
+            if value is None:
+                legal_moves = board.get_legal_moves(color)
+                if not legal_moves:
+                    value = -1.0
+                else:
+                    leaf = (search_path, legal_moves, encode_state(board.get_state(color)))
+
+        for _ in range(depth):
+            board.pop()
+
+        if value is None:
+            return leaf
+        self.remove_virtual_loss(search_path)
+        self.backpropagate(search_path, value)
+        return None
+
+    def expand_known(self, node, board, color):
+        # Resolves a leaf without the network when possible and returns its value
+        tree = self.tree
+        if board.generals[color] is None:
+            return -1.0
+        key = int(tree.key[node])
+        transposed = self.transposition_table.probe(key)
+        if transposed is not None and transposed != node and tree.key[transposed] == key \
+                and tree.is_expanded(transposed) and tree.visits[transposed] > 0:
+            tree.share_children(node, transposed)
+            return float(tree.value_sum[transposed] / tree.visits[transposed])
+        cached = self.evaluation_cache.get(key)
+        if cached is not None:
+            policy_indices, priors, value = cached
+            self.expand(node, policy_indices, priors)
+            return value
+        return None
+
+    def backup_leaves(self, pending, priors, values):
+        for (search_path, legal_moves, _), leaf_priors, leaf_value in zip(pending, priors, values):
+            node = search_path[-1]
+            policy_indices = [policy_index(move) for move in legal_moves]
+            self.evaluation_cache.put(int(self.tree.key[node]), policy_indices, leaf_priors, leaf_value)
+            self.remove_virtual_loss(search_path)
+            self.expand(node, policy_indices, leaf_priors)
+            self.backpropagate(search_path, leaf_value)
+
+    def expand(self, node, policy_indices, priors):
+        # A full tree leaves the node unexpanded; its value is still backed up
+        if self.tree.expand(node, policy_indices, priors):
+            self.transposition_table.store(int(self.tree.key[node]), node)
+
+    def remove_virtual_loss(self, path):
+        tree = self.tree
+        for node in path[1:]:
+            tree.visits[node] -= 1
+            tree.value_sum[node] -= self.virtual_loss
 
     def select_child(self, node):
-        if not node.children:
-            return node  # 如果節點沒有子節點，直接返回該節點
-        return max(node.children, key=lambda c: self.ucb_score(node, c))
-
-    def ucb_score(self, parent, child):
-        if child.visits == 0:
-            return float('inf')  # 返回無窮大，確保未訪問的節點會被選中
-        q_value = 1 - ((child.value / child.visits) + 1) / 2
-        return q_value + self.c_puct * child.prior * (math.sqrt(parent.visits) / (1 + child.visits))
-
-    def expand(self, node, policy, legal_moves):
-        for move in legal_moves:
-            if move in policy:
-                prob = policy[move]
-                child = MCTSNode(self.get_next_state(node.state, move), parent=node, action=move, prior=prob)
-                node.children.append(child)
+        # PUCT over the whole child block at once: q + c_puct * prior * sqrt(N) / (1 + n)
+        tree = self.tree
+        start = int(tree.first_child[node])
+        end = start + int(tree.num_children[node])
+        visits = tree.visits[start:end]
+        unvisited = np.flatnonzero(visits == 0)
+        if unvisited.size:
+            return start + int(unvisited[0])  # 未訪問的節點分數為無窮大，優先選中
+        q_values = 1 - (tree.value_sum[start:end] / visits + 1) / 2
+        exploration = self.c_puct * math.sqrt(tree.visits[node])
+        scores = q_values + exploration * tree.prior[start:end] / (1 + visits)
+        return start + int(np.argmax(scores))
 
     def backpropagate(self, path, value):
+        # `value` is from the point of view of the side to move at the leaf
+        tree = self.tree
         for node in reversed(path):
-            node.visits += 1
-            node.value += value
-            value = 1 - value
-
-    def apply_move(self, state, move):
-        # 這裡需要實現移動棋子後的新狀態
-        # 為了簡化，這裡返回原狀態，實際應用中需要修改
-        return state
-
-def train_network(model, games):
-    optimizer = mx.optimizer.Adam(learning_rate=0.001)
-
-    @mx.compile
-    def train_step(model, inputs, policy_targets, value_targets):
-        def loss_fn(model, inputs, policy_targets, value_targets):
-            policy_outputs, value_outputs = model(inputs)
-            policy_loss = mx.mean(mx.losses.categorical_crossentropy(policy_targets, policy_outputs))
-            value_loss = mx.mean(mx.losses.mean_squared_error(value_targets, value_outputs))
-            return policy_loss + value_loss
-
-        loss, grads = mx.value_and_grad(loss_fn)(model, inputs, policy_targets, value_targets)
-        optimizer.update(model, grads)
-        return loss
-
-    for game in games:
-        states, policy_targets, value_targets = process_game(game)
-        loss = train_step(model, states, policy_targets, value_targets)
-        print(f"Loss: {loss.item()}")
-
-def process_game(game):
-    # 將遊戲數據轉換為訓練數據
-    # 這裡需要實現將遊戲狀態轉換為神經網絡輸入的邏輯
-    # 為了簡化，這裡返回空數據，實際應用中需要修改
-    return mx.array([]), mx.array([]), mx.array([])
-
-def print_move(action):
+            tree.visits[node] += 1
+            tree.value_sum[node] += value
+            value = -value
+
+def evaluate_batch(model, leaves):
+    # One compiled forward pass and one device sync for a batch of (path, legal_moves,
+    # input) leaves; returns the priors over each leaf's legal moves and its value
+    legal_mask = np.zeros((len(leaves), NUM_MOVES), dtype=bool)
+    indices = []
+    for i, (_, legal_moves, _) in enumerate(leaves):
+        indices.extend(i * NUM_MOVES + policy_index(move) for move in legal_moves)
+    legal_mask.reshape(-1)[indices] = True
+    priors, value = model.predict(mx.concatenate([leaf[2] for leaf in leaves], axis=0), mx.array(legal_mask))
+    flat_priors = mx.reshape(priors, (-1,))[mx.array(indices)].tolist()
+    values = mx.reshape(value, (-1,)).tolist()
+
+    leaf_priors = []
+    offset = 0
+    for _, legal_moves, _ in leaves:
+        leaf_priors.append(flat_priors[offset:offset + len(legal_moves)])
+        offset += len(legal_moves)
+    return leaf_priors, values
+
+def run_search(model, search):
+    # Drives a search generator (see MCTS.search) to completion on its own
+    try:
+        pending = next(search)
+        while True:
+            pending = search.send(evaluate_batch(model, pending))
+    except StopIteration as stop:
+        return stop.value
+
+def encode_state(state):
+    # One (NUM_PLANES, 10, 9) int8 state from ChessBoard.get_state as a network batch of one
+    return mx.array(state[None]).astype(mx.float32)
+
+def encode_planes(planes):
+    # Batched encode_state, e.g. for replay buffer records
+    return mx.array(planes).astype(mx.float32)
+
+def policy_index(move):
+    # Index of the move in the policy output, see move_encoding
+    return move_index(move)
+
+def policy_move(index):
+    return index_move(index)
+
+def create_optimizer(learning_rate=0.001):
+    # Keep one per model and pass it to every train_network call so Adam's moments persist
+    return optim.Adam(learning_rate=learning_rate)
+
+def train_network(model, optimizer, batches, log_every=100):
+    # `batches` yields (planes, policy_targets, value_targets) numpy minibatches, e.g. a
+    # data_loader.MinibatchLoader. The loss is only read back every `log_every` steps.
+    def loss_fn(parameters, inputs, policy_targets, value_targets):
+        policy_outputs, value_outputs = model.forward(parameters, inputs)
+        log_policy = policy_outputs - mx.logsumexp(policy_outputs, axis=1, keepdims=True)
+        policy_loss = -mx.mean(mx.sum(policy_targets * log_policy, axis=1))
+        value_loss = mx.mean(mx.square(value_outputs.reshape(-1) - value_targets))
+        return policy_loss + value_loss
+
+    loss_and_grad = mx.value_and_grad(loss_fn)
+    total_loss = mx.array(0.0)
+    logged_loss = 0.0
+    steps = 0
+    for planes, policy_targets, value_targets in batches:
+        parameters = model.parameters()
+        loss, grads = loss_and_grad(parameters, encode_planes(planes), mx.array(policy_targets),
+                                    mx.array(value_targets))
+        model.update(optimizer.apply_gradients(grads, parameters))
+        total_loss = total_loss + loss
+        mx.eval(model.parameters(), optimizer.state, total_loss)
+        steps += 1
+        if steps % log_every == 0:
+            loss_sum = total_loss.item()
+            print(f"Step {steps}: loss {(loss_sum - logged_loss) / log_every:.4f}")
+            logged_loss = loss_sum
+    return total_loss.item() / steps if steps else None
+
+def game_positions(game):
+    # Replays a self-play record (see selfplay.play_game) and yields, per ply, the
+    # int8 board planes, the root visit counts and the side-to-move value target
+    board = ChessBoard()
+    color = "red"
+    for move, (policy_indices, visits) in zip(game["moves"], game["policies"]):
+        planes = board.get_state(color).copy()
+        if game["winner"] is None:
+            value = 0.0
+        else:
+            value = 1.0 if game["winner"] == color else -1.0
+        yield planes, policy_indices, visits, value
+        board.push(tuple(map(tuple, move)))
+        color = "black" if color == "red" else "red"
+
+def print_move(player_color, action):
     from_pos, to_pos = action
-    print(f"Move: {from_pos} to {to_pos}")
\ No newline at end of file
+    print(f"{player_color.capitalize()} move: {from_pos} to {to_pos}")
\ No newline at end of file
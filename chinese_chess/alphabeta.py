@@ -0,0 +1,250 @@
+import time
+from chess_pieces import SQUARE_POSITIONS
+from transposition import TranspositionTable
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+
+# Material by piece code (General=1 ... Soldier=7); the general is covered by mate scores
+PIECE_VALUES = (0, 0, 120, 120, 270, 600, 285, 30)
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+
+def _piece_square_bonus(code, x, rank):
+    # `rank` counts from the owner's back rank (0) towards the enemy's (9)
+    center = 4 - abs(x - 4)
+    if code == 7:  # Soldier: worth much more once across the river, best near the centre
+        if rank < 5:
+            return 0
+        return (30, 45, 55, 45, 15)[rank - 5] + 3 * center
+    if code == 4:  # Horse: centralised and advanced
+        return 4 * center + (8 if 3 <= rank <= 7 else 0) - (10 if rank == 0 else 0)
+    if code == 5:  # Chariot: open, advanced files
+        return 2 * center + (10 if rank >= 5 else 0)
+    if code == 6:  # Cannon: central file and its own back area
+        return (12 if x == 4 else 0) + (5 if rank <= 2 else 0)
+    if code == 1:  # General: safest on its own back rank and central file
+        return -8 * rank - 4 * abs(x - 4)
+    return 0
+
+
+def _build_piece_square_tables():
+    # TABLES[red_at_bottom][mailbox value + 7][square], signed for red's point of view
+    tables = {}
+    for red_at_bottom in (True, False):
+        table = [[0] * 90 for _ in range(15)]
+        for value in range(-7, 8):
+            if value == 0:
+                continue
+            code = abs(value)
+            bottom = (value > 0) == red_at_bottom
+            sign = 1 if value > 0 else -1
+            for square, (x, y) in enumerate(SQUARE_POSITIONS):
+                rank = 9 - y if bottom else y
+                table[value + 7][square] = sign * (PIECE_VALUES[code] + _piece_square_bonus(code, x, rank))
+        tables[red_at_bottom] = table
+    return tables
+
+
+PIECE_SQUARE_TABLES = _build_piece_square_tables()
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaSearch:
+    def __init__(self, time_limit=0.5, max_depth=32, transposition_table=None, quiescence_depth=8):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.quiescence_depth = quiescence_depth
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable()
+        self.killers = []
+        self.history = {}
+        self.nodes = 0
+        self.deadline = None
+        self.last_search = {}
+
+    def get_action(self, board, player_color, time_limit=None, max_depth=None):
+        # Iterative deepening; returns the best move of the deepest completed iteration
+        time_limit = self.time_limit if time_limit is None else time_limit
+        max_depth = self.max_depth if max_depth is None else max_depth
+        start_time = time.perf_counter()
+        self.deadline = start_time + time_limit if time_limit is not None else None
+        self.transposition_table.new_search()
+        self.killers = [[None, None] for _ in range(max_depth + self.quiescence_depth + 2)]
+        self.history = {}
+        self.nodes = 0
+
+        moves = board.get_legal_moves(player_color)
+        if not moves:
+            return None
+        best_move = moves[0]
+        best_score = None
+        depth_reached = 0
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self.negamax(board, depth, -INFINITY, INFINITY, player_color, 0)
+            except SearchTimeout:
+                # Unwind the moves pushed by the interrupted iteration
+                while len(board.move_stack) > self.root_stack_size:
+                    board.pop()
+                break
+            entry = self.transposition_table.probe(board.position_key(player_color))
+            if entry is not None and entry[3] is not None:
+                best_move = entry[3]
+            best_score = score
+            depth_reached = depth
+            if abs(score) >= MATE_SCORE - max_depth:
+                break  # Forced mate found, deeper search cannot change the move
+
+        elapsed = time.perf_counter() - start_time
+        self.last_search = {
+            "depth": depth_reached,
+            "score": best_score,
+            "nodes": self.nodes,
+            "seconds": elapsed,
+            "nodes_per_second": self.nodes / elapsed if elapsed else 0.0,
+        }
+        return best_move
+
+    def evaluate(self, board, color):
+        table = PIECE_SQUARE_TABLES[board.red_at_bottom]
+        mailbox = board.mailbox
+        score = 0
+        for piece in board.pieces:
+            x, y = piece.position
+            square = x + 9 * y
+            score += table[mailbox[square] + 7][square]
+        return score if color == "red" else -score
+
+    def check_time(self):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def negamax(self, board, depth, alpha, beta, color, ply):
+        if ply == 0:
+            self.root_stack_size = len(board.move_stack)
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_time()
+        if board.generals[color] is None:
+            return -MATE_SCORE + ply  # General captured, e.g. after an illegal human move
+
+        key = board.position_key(color)
+        entry = self.transposition_table.probe(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, entry_score, entry_flag, tt_move = entry
+            if ply > 0 and entry_depth >= depth:
+                if entry_flag == EXACT:
+                    return entry_score
+                if entry_flag == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if entry_flag == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        if depth <= 0:
+            return self.quiescence(board, alpha, beta, color, ply, 0)
+
+        moves = board.get_legal_moves(color)
+        if not moves:
+            return -MATE_SCORE + ply  # Checkmate or stalemate, both lost in xiangqi
+
+        enemy_color = "black" if color == "red" else "red"
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        mailbox = board.mailbox
+        for move in self.order_moves(board, moves, tt_move, ply):
+            (from_x, from_y), (to_x, to_y) = move
+            is_capture = mailbox[to_x + 9 * to_y] != 0
+            board.push(move)
+            score = -self.negamax(board, depth - 1, -beta, -alpha, enemy_color, ply + 1)
+            board.pop()
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not is_capture:
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    history_key = (from_x + 9 * from_y, to_x + 9 * to_y)
+                    self.history[history_key] = self.history.get(history_key, 0) + depth * depth
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.transposition_table.store(key, (depth, best_score, flag, best_move), depth)
+        return best_score
+
+    def quiescence(self, board, alpha, beta, color, ply, quiescence_ply):
+        # Captures only, except that a side in check must search every evasion
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_time()
+        if board.generals[color] is None:
+            return -MATE_SCORE + ply
+
+        in_check = board.is_in_check(color)
+        if not in_check:
+            stand_pat = self.evaluate(board, color)
+            if stand_pat >= beta or quiescence_ply >= self.quiescence_depth:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            best_score = stand_pat
+        else:
+            best_score = -MATE_SCORE + ply
+
+        moves = board.get_legal_moves(color, captures_only=not in_check)
+        if in_check:
+            if not moves:
+                return -MATE_SCORE + ply
+            if quiescence_ply >= self.quiescence_depth:
+                return self.evaluate(board, color)
+
+        enemy_color = "black" if color == "red" else "red"
+        for move in self.order_moves(board, moves, None, ply):
+            board.push(move)
+            score = -self.quiescence(board, -beta, -alpha, enemy_color, ply + 1, quiescence_ply + 1)
+            board.pop()
+            if score > best_score:
+                best_score = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        return best_score
+
+    def order_moves(self, board, moves, tt_move, ply):
+        # TT move, then captures by MVV-LVA, then killers, then history
+        mailbox = board.mailbox
+        killers = self.killers[ply] if ply < len(self.killers) else (None, None)
+        history = self.history
+
+        def score(move):
+            if move == tt_move:
+                return 1 << 30
+            (from_x, from_y), (to_x, to_y) = move
+            from_square = from_x + 9 * from_y
+            to_square = to_x + 9 * to_y
+            victim = mailbox[to_square]
+            if victim:
+                return (1 << 28) + PIECE_VALUES[abs(victim)] * 16 - PIECE_VALUES[abs(mailbox[from_square])] // 16
+            if move == killers[0]:
+                return 1 << 27
+            if move == killers[1]:
+                return (1 << 27) - 1
+            return history.get((from_square, to_square), 0)
+
+        return sorted(moves, key=score, reverse=True)
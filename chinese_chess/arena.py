@@ -0,0 +1,165 @@
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from chess_board import ChessBoard
+from ai import ChessNet, MCTS
+from alphabeta import AlphaBetaSearch
+from selfplay import WORKER_THREAD_VARIABLES
+
+# Plays two players against each other to decide whether a new checkpoint is stronger.
+# A player is a checkpoint path (MCTS with that network), "alphabeta" or
+# "alphabeta:<seconds per move>", or "random".
+
+class RandomPlayer:
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def get_action(self, board, player_color):
+        moves = board.get_legal_moves(player_color)
+        return self.rng.choice(moves) if moves else None
+
+def make_player(spec, simulations=200, seed=0):
+    if spec == "random":
+        return RandomPlayer(seed)
+    if spec == "alphabeta" or spec.startswith("alphabeta:"):
+        _, _, seconds = spec.partition(":")
+        return AlphaBetaSearch(time_limit=float(seconds) if seconds else 0.5)
+    return MCTS(ChessNet.load(spec), num_simulations=simulations, verbose=False)
+
+def play_match(players, opening_seed, opening_plies=4, max_plies=300):
+    # players maps "red"/"black" to players; returns the winning color or None for a draw.
+    # The first plies are seeded random moves so paired games share an opening.
+    for player in players.values():
+        if hasattr(player, "reset"):
+            player.reset()
+    rng = random.Random(opening_seed)
+    board = ChessBoard()
+    color = "red"
+    seen = {}
+    for ply in range(max_plies):
+        if ply < opening_plies:
+            moves = board.get_legal_moves(color)
+            action = rng.choice(moves) if moves else None
+        else:
+            action = players[color].get_action(board, color)
+        if action is None:
+            return "black" if color == "red" else "red"
+        board.push(action)
+        color = "black" if color == "red" else "red"
+        if board.generals[color] is None:
+            return "black" if color == "red" else "red"
+        key = board.position_key(color)
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] == 3:
+            return None  # Threefold repetition
+    return None
+
+_worker = {}
+
+def _init_worker(candidate, opponent, simulations):
+    _worker["players"] = (make_player(candidate, simulations, seed=os.getpid()),
+                          make_player(opponent, simulations, seed=os.getpid() + 1))
+
+def _play_arena_game(task):
+    # Game 2k and 2k + 1 share an opening with the colors swapped
+    index, options = task
+    candidate, opponent = _worker["players"]
+    candidate_color = "red" if index % 2 == 0 else "black"
+    opponent_color = "black" if candidate_color == "red" else "red"
+    start = time.perf_counter()
+    winner = play_match({candidate_color: candidate, opponent_color: opponent}, options["seed"] + index // 2,
+                        options["opening_plies"], options["max_plies"])
+    score = 0.5 if winner is None else float(winner == candidate_color)
+    return {"game": index, "candidate_color": candidate_color, "winner": winner, "score": score,
+            "seconds": time.perf_counter() - start}
+
+def run_arena(candidate, opponent, num_games, workers=None, simulations=200, opening_plies=4, max_plies=300, seed=0):
+    # Yields one result per game, from the candidate's point of view, as games finish
+    workers = workers or os.cpu_count()
+    for name in WORKER_THREAD_VARIABLES:
+        os.environ.setdefault(name, "1")
+    context = multiprocessing.get_context("spawn")
+    options = {"seed": seed, "opening_plies": opening_plies, "max_plies": max_plies}
+    with context.Pool(workers, initializer=_init_worker, initargs=(candidate, opponent, simulations)) as pool:
+        for result in pool.imap_unordered(_play_arena_game, ((index, options) for index in range(num_games))):
+            yield result
+
+def elo_difference(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+def summarize(results, seconds, z=1.96):
+    # Win/draw/loss, score rate and Elo with a Wilson confidence interval on the score
+    # rate (draws count half), which stays wide after a short run of identical results
+    scores = [result["score"] for result in results]
+    games = len(scores)
+    mean = sum(scores) / games
+    center = (mean + z * z / (2 * games)) / (1 + z * z / games)
+    margin = z * math.sqrt(mean * (1 - mean) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return {
+        "games": games,
+        "wins": scores.count(1.0),
+        "draws": scores.count(0.5),
+        "losses": scores.count(0.0),
+        "score": mean,
+        "elo": elo_difference(mean),
+        "elo_low": elo_difference(center - margin),
+        "elo_high": elo_difference(center + margin),
+        "games_per_hour": games / seconds * 3600,
+    }
+
+def promote(candidate, destination):
+    # Copy, then rename into place, so readers of `destination` never see half a file
+    root, extension = os.path.splitext(destination)
+    temporary = f"{root}.tmp{os.getpid()}{extension}"
+    shutil.copyfile(candidate, temporary)
+    os.replace(temporary, destination)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a candidate against an opponent and rate the result")
+    parser.add_argument("candidate", help="checkpoint, 'alphabeta[:seconds]' or 'random'")
+    parser.add_argument("opponent", help="checkpoint, 'alphabeta[:seconds]' or 'random'")
+    parser.add_argument("--games", type=int, default=40, help="games to play, colors alternate")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--simulations", type=int, default=200, help="MCTS simulations per move")
+    parser.add_argument("--opening-plies", type=int, default=4, help="random plies shared by each pair of games")
+    parser.add_argument("--max-plies", type=int, default=300, help="longer games are drawn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--promote-threshold", type=float,
+                        help="score rate at or above which the candidate checkpoint is promoted")
+    parser.add_argument("--promote-to", default="models/best.safetensors")
+    args = parser.parse_args(argv)
+    if args.games < 1:
+        parser.error("--games must be at least 1")
+
+    print(f"Arena: {args.candidate} vs {args.opponent}, {args.games} games on {args.workers} workers")
+    start = time.perf_counter()
+    results = []
+    for result in run_arena(args.candidate, args.opponent, args.games, args.workers, args.simulations,
+                            args.opening_plies, args.max_plies, args.seed):
+        results.append(result)
+        outcome = {1.0: "win", 0.5: "draw", 0.0: "loss"}[result["score"]]
+        print(f"[{len(results)}/{args.games}] game {result['game']}: candidate {result['candidate_color']}, "
+              f"{outcome} ({result['seconds']:.1f}s)")
+
+    summary = summarize(results, time.perf_counter() - start)
+    print(f"+{summary['wins']} ={summary['draws']} -{summary['losses']}, score {summary['score']:.3f}")
+    print(f"Elo {summary['elo']:+.0f} (95% CI {summary['elo_low']:+.0f} to {summary['elo_high']:+.0f})")
+    print(f"{summary['games_per_hour']:.1f} games/hour")
+    if args.promote_threshold is not None:
+        if summary["score"] < args.promote_threshold:
+            print(f"Not promoted: score {summary['score']:.3f} below {args.promote_threshold}")
+            return 1
+        if not os.path.isfile(args.candidate):
+            print(f"Passed the threshold, but {args.candidate} is not a checkpoint to promote")
+            return 1
+        promote(args.candidate, args.promote_to)
+        print(f"Promoted {args.candidate} to {args.promote_to}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+import os
+import pygame
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font", "font.ttf")
+
+class BoardView:
+    # Draws a ChessBoard and maps screen coordinates to it; all pygame use is here
+    def __init__(self, width, height):
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.BOARD_SIZE_W = 720
+        self.BOARD_SIZE_H = 810
+        self.MARGIN_W = (self.WIDTH - self.BOARD_SIZE_W) // 2
+        self.MARGIN_H = (self.HEIGHT - self.BOARD_SIZE_H) // 2
+        self.GRID_SIZE_W = self.BOARD_SIZE_W // 8
+        self.GRID_SIZE_H = self.BOARD_SIZE_H // 9
+
+        self.BACKGROUND_COLOR = (255, 248, 220)  # Light yellow
+        self.LINE_COLOR = (200, 0, 0)  # Red
+        self.MARK_COLOR = (200, 0, 0)  # Red
+
+        self.font = None  # Loaded on first draw, after pygame is initialised
+        self.selected_piece = None
+        self.dragging = False
+
+    def get_board_position(self, screen_pos):
+        x = round((screen_pos[0] - self.MARGIN_W) / self.GRID_SIZE_W)
+        y = round((screen_pos[1] - self.MARGIN_H) / self.GRID_SIZE_H)
+        if 0 <= x <= 8 and 0 <= y <= 9:
+            return (x, y)
+        return None
+
+    def get_piece_at_pos(self, board, pos):
+        for piece in board.pieces:
+            x = self.MARGIN_W + piece.position[0] * self.GRID_SIZE_W
+            y = self.MARGIN_H + piece.position[1] * self.GRID_SIZE_H
+            if ((pos[0] - x) ** 2 + (pos[1] - y) ** 2) <= 30 ** 2:
+                return piece
+        return None
+
+    def draw(self, screen, board, mouse_pos):
+        if self.font is None:
+            self.font = pygame.font.Font(FONT_PATH, 36)
+        screen.fill(self.BACKGROUND_COLOR)
+
+        # Draw vertical lines
+        for i in range(9):
+            x = self.MARGIN_W + i * self.GRID_SIZE_W
+            if i == 0 or i == 8:
+                pygame.draw.line(screen, self.LINE_COLOR, (x, self.MARGIN_H), (x, self.HEIGHT - self.MARGIN_H), 2)
+            else:
+                pygame.draw.line(screen, self.LINE_COLOR, (x, self.MARGIN_H), (x, self.MARGIN_H + self.GRID_SIZE_H * 4), 2)
+                pygame.draw.line(screen, self.LINE_COLOR, (x, self.MARGIN_H + self.GRID_SIZE_H * 5), (x, self.HEIGHT - self.MARGIN_H), 2)
+
+        # Draw horizontal lines
+        for i in range(10):
+            y = self.MARGIN_H + i * self.GRID_SIZE_H
+            pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W, y), (self.WIDTH - self.MARGIN_W, y), 2)
+
+        # Draw diagonal lines in the palace
+        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.MARGIN_H),
+                         (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.MARGIN_H + 2 * self.GRID_SIZE_H), 2)
+        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.MARGIN_H),
+                         (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.MARGIN_H + 2 * self.GRID_SIZE_H), 2)
+        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H),
+                         (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H - 2 * self.GRID_SIZE_H), 2)
+        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H),
+                         (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H - 2 * self.GRID_SIZE_H), 2)
+
+        # Draw "river" text
+        text = self.font.render("楚河            漢界", True, self.LINE_COLOR)
+        text_rect = text.get_rect(center=(self.WIDTH // 2, self.HEIGHT // 2))
+        screen.blit(text, text_rect)
+
+        # Mark positions for soldiers/pawns and cannons
+        mark_positions = [
+            # Black soldiers (卒)
+            (0, 3), (2, 3), (4, 3), (6, 3), (8, 3),
+            # Red soldiers (兵)
+            (0, 6), (2, 6), (4, 6), (6, 6), (8, 6),
+            # Black cannons (砲)
+            (1, 2), (7, 2),
+            # Red cannons (砲)
+            (1, 7), (7, 7)
+        ]
+
+        for col, row in mark_positions:
+            x = self.MARGIN_W + col * self.GRID_SIZE_W + 1
+            y = self.MARGIN_H + row * self.GRID_SIZE_H
+            pygame.draw.circle(screen, self.MARK_COLOR, (x, y), 6)
+
+        for piece in board.pieces:
+            if piece == self.selected_piece and self.dragging:
+                x, y = mouse_pos
+            else:
+                x = self.MARGIN_W + piece.position[0] * self.GRID_SIZE_W
+                y = self.MARGIN_H + piece.position[1] * self.GRID_SIZE_H
+            color = (255, 0, 0) if piece.color == "red" else (0, 0, 0)
+            pygame.draw.circle(screen, (255, 255, 255), (x, y), 30)  # White background
+            pygame.draw.circle(screen, color, (x, y), 30, 2)  # Colored border
+            text = self.font.render(piece.get_name(), True, color)
+            text_rect = text.get_rect(center=(x, y))
+            screen.blit(text, text_rect)
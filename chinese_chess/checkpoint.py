@@ -0,0 +1,94 @@
+import glob
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import mlx.core as mx
+
+# Checkpoints are safetensors files: a JSON header followed by the raw tensor bytes,
+# so they can be memory-mapped, and mx.load only reads a tensor once it is used.
+CHECKPOINT_FORMAT = "1"
+
+
+def save_weights(path, weights, metadata=None):
+    # Writes next to `path` and renames over it, so readers never see a partial file
+    root, extension = os.path.splitext(path)
+    temporary = f"{root}.tmp{os.getpid()}"
+    if extension == ".npz":
+        mx.savez(temporary, **weights)
+        temporary += ".npz"
+    else:
+        mx.save_safetensors(temporary, weights, metadata=metadata)
+        temporary += ".safetensors"
+    os.replace(temporary, path)
+
+
+def checkpoint_versions(directory, name):
+    # (version, path) of every <name>_<version>.safetensors in `directory`, oldest first
+    pattern = re.compile(re.escape(name) + r"_(\d+)\.safetensors")
+    found = []
+    for path in glob.glob(os.path.join(directory, f"{name}_*.safetensors")):
+        match = pattern.fullmatch(os.path.basename(path))
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+def latest_checkpoint(name="model", directory="models"):
+    # Newest version of `name` only, so quantized copies, the arena's best.safetensors
+    # or the GUI's model_red/model_black saves are never picked up by accident
+    versions = checkpoint_versions(directory, name)
+    return versions[-1][1] if versions else None
+
+
+class CheckpointManager:
+    # Versioned checkpoints <directory>/<name>_<version>.safetensors. Saves run on a
+    # background thread in submission order; only the newest `keep` of a name stay.
+    def __init__(self, directory="models", keep=5):
+        # The version just written always stays, so there is no keep=0
+        if keep < 1:
+            raise ValueError(f"keep must be at least 1, got {keep}")
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+        self.next_version = {}
+
+    def versions(self, name):
+        return checkpoint_versions(self.directory, name)
+
+    def latest(self, name):
+        return latest_checkpoint(name, self.directory)
+
+    def save(self, model, name="model", metadata=None):
+        # Snapshots the weights now (mlx arrays are immutable, so training may go on)
+        # and returns a future that resolves to the checkpoint path once it is on disk
+        weights = model.parameters()
+        mx.eval(weights)
+        if name not in self.next_version:
+            versions = self.versions(name)
+            self.next_version[name] = versions[-1][0] + 1 if versions else 1
+        version = self.next_version[name]
+        self.next_version[name] += 1
+        path = os.path.join(self.directory, f"{name}_{version:06d}.safetensors")
+        header = {"format": CHECKPOINT_FORMAT, "version": str(version),
+                  "channels": str(model.channels), "blocks": str(model.blocks)}
+        header.update(metadata or {})
+        future = self.writer.submit(self.write, path, weights, header, name)
+        self.pending = [saving for saving in self.pending if not saving.done()] + [future]
+        return future
+
+    def write(self, path, weights, metadata, name):
+        save_weights(path, weights, metadata)
+        for _, old_path in self.versions(name)[:-self.keep]:
+            os.remove(old_path)
+        return path
+
+    def wait(self):
+        for future in self.pending:
+            future.result()
+        self.pending = []
+
+    def close(self):
+        self.wait()
+        self.writer.shutdown()
@@ -1,57 +1,45 @@
-import pygame
-import mlx.core as mx
-from chess_pieces import General, Advisor, Elephant, Horse, Chariot, Cannon, Soldier
+import numpy as np
+from array import array
+from chess_pieces import General, Advisor, Elephant, Horse, Chariot, Cannon, Soldier, SQUARE_POSITIONS
+from chess_pieces import RAYS, HORSE_ATTACKERS, GENERAL_ATTACKERS, ADVISOR_ATTACKERS, ELEPHANT_ATTACKERS, SOLDIER_ATTACKERS
+from zobrist import PIECE_KEYS, BLACK_TO_MOVE_KEY
+
+FEN_PIECES = {"k": General, "a": Advisor, "b": Elephant, "e": Elephant, "n": Horse, "h": Horse,
+              "r": Chariot, "c": Cannon, "p": Soldier}
+FEN_CHARS = {General: "k", Advisor: "a", Elephant: "b", Horse: "n", Chariot: "r", Cannon: "c", Soldier: "p"}
+
+# Network input planes, each 10 rows by 9 files: one per piece type for red
+# (codes 1-7), then for black, then a side-to-move plane (all ones when red moves)
+NUM_PLANES = 15
+SIDE_TO_MOVE_PLANE = 14
+# Byte offset of a piece's plane in ChessBoard.planes, by signed piece code + 7
+PLANE_OFFSETS = [((value - 1) if value > 0 else (6 - value)) * 90 if value else None for value in range(-7, 8)]
 
 class ChessBoard:
-    def __init__(self, width, height, red_at_bottom=True):
+    # Rules and position only; drawing and mouse state live in board_view.BoardView
+    def __init__(self, red_at_bottom=True):
         self.red_at_bottom = red_at_bottom
+        self.setup_pieces()
 
-        self.WIDTH = width
-        self.HEIGHT = height
-        self.BOARD_SIZE_W = 720
-        self.BOARD_SIZE_H = 810
-        self.MARGIN_W = (self.WIDTH - self.BOARD_SIZE_W) // 2
-        self.MARGIN_H = (self.HEIGHT - self.BOARD_SIZE_H) // 2
-        self.GRID_SIZE_W = self.BOARD_SIZE_W // 8
-        self.GRID_SIZE_H = self.BOARD_SIZE_H // 9
-
-        self.BACKGROUND_COLOR = (255, 248, 220)  # Light yellow
-        self.LINE_COLOR = (200, 0, 0)  # Red
-        self.MARK_COLOR = (200, 0, 0)  # Red
-
-        self.font = pygame.font.Font("font/font2.ttf", 36)
+    def clear(self):
         self.pieces = []
-        self.setup_pieces()
-        self.selected_piece = None
-        self.dragging = False
-
-        self.piece_to_channel = {
-            "General": 0,
-            "Advisor": 1,
-            "Elephant": 2,
-            "Horse": 3,
-            "Chariot": 4,
-            "Cannon": 5,
-            "Soldier": 6
-        }
-
-    def get_state(self):
-        state = mx.zeros((7, 9, 10))  # 7 kinds of chess pieces, 9 * 10 chess board
-        for piece in self.pieces:
-            x, y = piece.position
-            piece_type = type(piece).__name__
-            color = 1 if piece.color == "red" else -1
-            channel = self.piece_to_channel[piece_type]
-            state[channel, x, y] = color
-        return state
+        # 90-square mailbox (index = x + 9 * y): signed piece code, positive for red
+        self.mailbox = array('b', bytes(90))
+        self.piece_map = [None] * 90
+        self.pieces_by_color = {"red": [], "black": []}
+        self.generals = {"red": None, "black": None}
+        self.move_stack = []
+        self.hash = 0  # Zobrist key of the piece placement, see position_key
+        # Occupancy planes kept in step with the mailbox; see get_state
+        self.planes = bytearray(NUM_PLANES * 90)
 
     def setup_pieces(self):
-        self.pieces = []
+        self.clear()
         bottom_color = "red" if self.red_at_bottom else "black"
         top_color = "black" if self.red_at_bottom else "red"
 
         # Bottom pieces
-        self.pieces.extend([
+        self.add_pieces([
             General(bottom_color, (4, 9)),
             Advisor(bottom_color, (3, 9)), Advisor(bottom_color, (5, 9)),
             Elephant(bottom_color, (2, 9)), Elephant(bottom_color, (6, 9)),
@@ -64,7 +52,7 @@ class ChessBoard:
         ])
 
         # Top pieces
-        self.pieces.extend([
+        self.add_pieces([
             General(top_color, (4, 0)),
             Advisor(top_color, (3, 0)), Advisor(top_color, (5, 0)),
             Elephant(top_color, (2, 0)), Elephant(top_color, (6, 0)),
@@ -76,17 +64,96 @@ class ChessBoard:
             Soldier(top_color, (8, 3)),
         ])
 
+    def set_fen(self, fen):
+        # Standard xiangqi FEN: uppercase is red, first rank is black's back rank.
+        # Returns the side to move.
+        fields = fen.split()
+        self.clear()
+        for row, rank in enumerate(fields[0].split("/")):
+            x = 0
+            for char in rank:
+                if char.isdigit():
+                    x += int(char)
+                    continue
+                color = "red" if char.isupper() else "black"
+                position = (x, row) if self.red_at_bottom else (8 - x, 9 - row)
+                self.add_piece(FEN_PIECES[char.lower()](color, position))
+                x += 1
+        return "black" if len(fields) > 1 and fields[1] == "b" else "red"
+
+    def get_fen(self, color):
+        ranks = []
+        for row in range(10):
+            rank = ""
+            empty = 0
+            for x in range(9):
+                square = x + 9 * row if self.red_at_bottom else (8 - x) + 9 * (9 - row)
+                piece = self.piece_map[square]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                char = FEN_CHARS[type(piece)]
+                rank += char.upper() if piece.color == "red" else char
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        return "/".join(ranks) + (" b" if color == "black" else " w")
+
+    def add_pieces(self, pieces):
+        for piece in pieces:
+            self.add_piece(piece)
+
+    def add_piece(self, piece, indices=None):
+        x, y = piece.position
+        square = x + 9 * y
+        if indices is None:
+            self.pieces.append(piece)
+            self.pieces_by_color[piece.color].append(piece)
+        else:
+            # Reinsert where remove_piece took it from, keeping list order stable
+            self.pieces.insert(indices[0], piece)
+            self.pieces_by_color[piece.color].insert(indices[1], piece)
+        value = piece.code if piece.color == "red" else -piece.code
+        self.mailbox[square] = value
+        self.piece_map[square] = piece
+        self.planes[PLANE_OFFSETS[value + 7] + square] = 1
+        self.hash ^= PIECE_KEYS[value + 7][square]
+        if isinstance(piece, General):
+            self.generals[piece.color] = piece
+
+    def remove_piece(self, piece):
+        x, y = piece.position
+        square = x + 9 * y
+        index = self.pieces.index(piece)
+        del self.pieces[index]
+        color_pieces = self.pieces_by_color[piece.color]
+        color_index = color_pieces.index(piece)
+        del color_pieces[color_index]
+        value = self.mailbox[square]
+        self.hash ^= PIECE_KEYS[value + 7][square]
+        self.planes[PLANE_OFFSETS[value + 7] + square] = 0
+        self.mailbox[square] = 0
+        self.piece_map[square] = None
+        if self.generals[piece.color] is piece:
+            self.generals[piece.color] = None
+        return index, color_index
+
     def count_pieces_between(self, start, end):
         x1, y1 = start
         x2, y2 = end
+        mailbox = self.mailbox
         count = 0
         if x1 == x2:  # Vertical movement
             for y in range(min(y1, y2) + 1, max(y1, y2)):
-                if self.is_piece_at((x1, y)):
+                if mailbox[x1 + 9 * y]:
                     count += 1
         elif y1 == y2:  # Horizontal movement
+            row = 9 * y1
             for x in range(min(x1, x2) + 1, max(x1, x2)):
-                if self.is_piece_at((x, y1)):
+                if mailbox[x + row]:
                     count += 1
         return count
 
@@ -101,219 +168,226 @@ class ChessBoard:
         else:
             return 3 <= x <= 5 and 0 <= y <= 2
 
-    def is_general_facing_general(self, new_position=None):
-        red_general = next((p for p in self.pieces if isinstance(p, General) and p.color == "red"), None)
-        black_general = next((p for p in self.pieces if isinstance(p, General) and p.color == "black"), None)
+    def is_general_facing_general(self):
+        red_general = self.generals["red"]
+        black_general = self.generals["black"]
 
         if not red_general or not black_general:
             return False
 
-        if new_position:
-            if isinstance(self.get_piece_at(new_position), General):
-                if self.get_piece_at(new_position).color == "red":
-                    red_general.position = new_position
-                else:
-                    black_general.position = new_position
-
         if red_general.position[0] != black_general.position[0]:
             return False
 
+        x = red_general.position[0]
         min_y = min(red_general.position[1], black_general.position[1])
         max_y = max(red_general.position[1], black_general.position[1])
 
+        mailbox = self.mailbox
         for y in range(min_y + 1, max_y):
-            if self.get_piece_at((red_general.position[0], y)):
+            if mailbox[x + 9 * y]:
                 return False
 
         return True
 
-    def is_in_check(self, color):
-        general = next((p for p in self.pieces if isinstance(p, General) and p.color == color), None)
-        if not general:
-            return False
+    def is_square_attacked(self, square, by_color):
+        # Scan outward from `square` instead of asking every enemy piece
+        mailbox = self.mailbox
+        sign = 1 if by_color == "red" else -1
+        chariot = sign * Chariot.code
+        cannon = sign * Cannon.code
+
+        for direction, ray in enumerate(RAYS[square]):
+            screened = False
+            for target in ray:
+                value = mailbox[target]
+                if not value:
+                    continue
+                if screened:
+                    if value == cannon:
+                        return True
+                    break
+                # Rays 0 and 1 run along the file, where the flying general rule applies
+                if value == chariot or (direction < 2 and value == sign * General.code):
+                    return True
+                screened = True
+
+        horse = sign * Horse.code
+        for source, leg in HORSE_ATTACKERS[square]:
+            if mailbox[source] == horse and not mailbox[leg]:
+                return True
 
-        for piece in self.pieces:
-            if piece.color != color and piece.is_valid_move(general.position, self):
+        bottom = (by_color == "red") == self.red_at_bottom
+        soldier = sign * Soldier.code
+        for source in SOLDIER_ATTACKERS[bottom][square]:
+            if mailbox[source] == soldier:
+                return True
+        advisor = sign * Advisor.code
+        for source in ADVISOR_ATTACKERS[bottom][square]:
+            if mailbox[source] == advisor:
+                return True
+        general = sign * General.code
+        for source in GENERAL_ATTACKERS[bottom][square]:
+            if mailbox[source] == general:
+                return True
+        elephant = sign * Elephant.code
+        for source, eye in ELEPHANT_ATTACKERS[bottom][square]:
+            if mailbox[source] == elephant and not mailbox[eye]:
                 return True
         return False
 
-    def is_checkmate(self, color):
-        if not self.is_in_check(color):
+    def is_in_check(self, color):
+        general = self.generals[color]
+        if not general:
             return False
+        return self.is_square_attacked(general.square(), "black" if color == "red" else "red")
+
+    def is_safe_after(self, from_square, to_square, general_square, enemy_color):
+        # Apply the move to the mailbox only; the attack scan needs nothing else
+        mailbox = self.mailbox
+        moved = mailbox[from_square]
+        captured = mailbox[to_square]
+        mailbox[to_square] = moved
+        mailbox[from_square] = 0
+        if from_square == general_square:
+            general_square = to_square
+        attacked = self.is_square_attacked(general_square, enemy_color)
+        mailbox[from_square] = moved
+        mailbox[to_square] = captured
+        return not attacked
+
+    def iter_legal_moves(self, color, captures_only=False):
+        mailbox = self.mailbox
+        general = self.generals[color]
+        if general is None:
+            for piece in self.pieces_by_color[color]:
+                from_pos = piece.position
+                for target in piece.target_squares(self):
+                    if captures_only and not mailbox[target]:
+                        continue
+                    yield from_pos, SQUARE_POSITIONS[target]
+            return
+
+        enemy_color = "black" if color == "red" else "red"
+        general_square = general.square()
+        general_x, general_y = general.position
+        in_check = self.is_square_attacked(general_square, enemy_color)
+        for piece in list(self.pieces_by_color[color]):
+            from_pos = piece.position
+            from_square = from_pos[0] + 9 * from_pos[1]
+            # A move can only expose the general if it leaves the general's file or
+            # rank (chariot, cannon, flying general) or a horse-leg square next to it
+            exposed = (in_check or piece is general or from_pos[0] == general_x or from_pos[1] == general_y
+                       or (abs(from_pos[0] - general_x) == 1 and abs(from_pos[1] - general_y) == 1))
+            for target in piece.target_squares(self):
+                if captures_only and not mailbox[target]:
+                    continue
+                # Landing on the general's lines can also give an enemy cannon a screen
+                if exposed or target % 9 == general_x or target // 9 == general_y:
+                    if not self.is_safe_after(from_square, target, general_square, enemy_color):
+                        continue
+                yield from_pos, SQUARE_POSITIONS[target]
+
+    def has_legal_move(self, color):
+        return next(self.iter_legal_moves(color), None) is not None
 
-        general = next((p for p in self.pieces if isinstance(p, General) and p.color == color), None)
-        for piece in self.pieces:
-            if piece.color == color:
-                for x in range(9):
-                    for y in range(10):
-                        if piece.is_valid_move((x, y), self):
-                            # Try the move
-                            original_position = piece.position
-                            captured_piece = self.get_piece_at((x, y))
-                            if captured_piece:
-                                self.pieces.remove(captured_piece)
-                            piece.position = (x, y)
-
-                            still_in_check = self.is_in_check(color)
-
-                            # Undo the move
-                            piece.position = original_position
-                            if captured_piece:
-                                self.pieces.append(captured_piece)
-
-                            if not still_in_check:
-                                return False
-        return True
+    def is_checkmate(self, color):
+        return self.is_in_check(color) and not self.has_legal_move(color)
 
     def is_stalemate(self, color):
-        if self.is_in_check(color):
-            return False
-
-        for piece in self.pieces:
-            if piece.color == color:
-                for x in range(9):
-                    for y in range(10):
-                        if piece.is_valid_move((x, y), self):
-                            return False
-        return True
+        return not self.is_in_check(color) and not self.has_legal_move(color)
 
     def is_piece_at(self, position):
-        return any(piece.position == position for piece in self.pieces)
+        x, y = position
+        return 0 <= x <= 8 and 0 <= y <= 9 and self.mailbox[x + 9 * y] != 0
 
     def get_piece_at(self, position):
-        for piece in self.pieces:
-            if piece.position == position:
-                return piece
+        x, y = position
+        if 0 <= x <= 8 and 0 <= y <= 9:
+            return self.piece_map[x + 9 * y]
         return None
 
     def is_path_clear(self, start, end):
         x1, y1 = start
         x2, y2 = end
+        mailbox = self.mailbox
         if x1 == x2:  # Vertical movement
             for y in range(min(y1, y2) + 1, max(y1, y2)):
-                if self.is_piece_at((x1, y)):
+                if mailbox[x1 + 9 * y]:
                     return False
         elif y1 == y2:  # Horizontal movement
+            row = 9 * y1
             for x in range(min(x1, x2) + 1, max(x1, x2)):
-                if self.is_piece_at((x, y1)):
+                if mailbox[x + row]:
                     return False
         return True
 
     def is_general_captured(self):
-        red_general = any(p for p in self.pieces if isinstance(p, General) and p.color == "red")
-        black_general = any(p for p in self.pieces if isinstance(p, General) and p.color == "black")
-        return not (red_general and black_general)
+        return not (self.generals["red"] and self.generals["black"])
 
     def get_winner(self):
-        if not any(p for p in self.pieces if isinstance(p, General) and p.color == "red"):
+        if not self.generals["red"]:
             return "black"
-        if not any(p for p in self.pieces if isinstance(p, General) and p.color == "black"):
+        if not self.generals["black"]:
             return "red"
         return None
 
     def update_piece_position(self, piece, new_position):
+        old_x, old_y = piece.position
+        new_x, new_y = new_position
+        old_square = old_x + 9 * old_y
+        new_square = new_x + 9 * new_y
+        value = self.mailbox[old_square]
+        self.mailbox[old_square] = 0
+        self.piece_map[old_square] = None
+        self.mailbox[new_square] = value
+        self.piece_map[new_square] = piece
+        plane = PLANE_OFFSETS[value + 7]
+        self.planes[plane + old_square] = 0
+        self.planes[plane + new_square] = 1
+        keys = PIECE_KEYS[value + 7]
+        self.hash ^= keys[old_square] ^ keys[new_square]
         piece.position = new_position
 
-    def get_piece_at_pos(self, pos):
-        for piece in self.pieces:
-            x = self.MARGIN_W + piece.position[0] * self.GRID_SIZE_W
-            y = self.MARGIN_H + piece.position[1] * self.GRID_SIZE_H
-            if ((pos[0] - x) ** 2 + (pos[1] - y) ** 2) <= 30 ** 2:
-                return piece
-        return None
+    def position_key(self, color):
+        # 64-bit Zobrist key of the position with `color` to move
+        return self.hash ^ BLACK_TO_MOVE_KEY if color == "black" else self.hash
+
+    def get_state(self, color="red"):
+        # 將棋盤狀態轉換為神經網絡的輸入格式: int8 (NUM_PLANES, 10, 9) planes for
+        # `color` to move. Zero-copy view of self.planes, so copy it to keep it past the next move.
+        side = SIDE_TO_MOVE_PLANE * 90
+        self.planes[side:side + 90] = b"\x01" * 90 if color == "red" else bytes(90)
+        return np.frombuffer(self.planes, dtype=np.int8).reshape(NUM_PLANES, 10, 9)
 
-    def draw(self, screen, mouse_pos):
-        screen.fill(self.BACKGROUND_COLOR)
-
-        # Draw vertical lines
-        for i in range(9):
-            x = self.MARGIN_W + i * self.GRID_SIZE_W
-            if i == 0 or i == 8:
-                pygame.draw.line(screen, self.LINE_COLOR, (x, self.MARGIN_H), (x, self.HEIGHT - self.MARGIN_H), 2)
-            else:
-                pygame.draw.line(screen, self.LINE_COLOR, (x, self.MARGIN_H), (x, self.MARGIN_H + self.GRID_SIZE_H * 4), 2)
-                pygame.draw.line(screen, self.LINE_COLOR, (x, self.MARGIN_H + self.GRID_SIZE_H * 5), (x, self.HEIGHT - self.MARGIN_H), 2)
-
-        # Draw horizontal lines
-        for i in range(10):
-            y = self.MARGIN_H + i * self.GRID_SIZE_H
-            pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W, y), (self.WIDTH - self.MARGIN_W, y), 2)
-
-        # Draw diagonal lines in the palace
-        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.MARGIN_H),
-                         (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.MARGIN_H + 2 * self.GRID_SIZE_H), 2)
-        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.MARGIN_H),
-                         (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.MARGIN_H + 2 * self.GRID_SIZE_H), 2)
-        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H),
-                         (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H - 2 * self.GRID_SIZE_H), 2)
-        pygame.draw.line(screen, self.LINE_COLOR, (self.MARGIN_W + 5 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H),
-                         (self.MARGIN_W + 3 * self.GRID_SIZE_W, self.HEIGHT - self.MARGIN_H - 2 * self.GRID_SIZE_H), 2)
-
-        # Draw "river" text
-        text = self.font.render("楚河            漢界", True, self.LINE_COLOR)
-        text_rect = text.get_rect(center=(self.WIDTH // 2, self.HEIGHT // 2))
-        screen.blit(text, text_rect)
-
-        # Mark positions for soldiers/pawns and cannons
-        mark_positions = [
-            # Black soldiers (卒)
-            (0, 3), (2, 3), (4, 3), (6, 3), (8, 3),
-            # Red soldiers (兵)
-            (0, 6), (2, 6), (4, 6), (6, 6), (8, 6),
-            # Black cannons (砲)
-            (1, 2), (7, 2),
-            # Red cannons (砲)
-            (1, 7), (7, 7)
-        ]
-
-        for col, row in mark_positions:
-            x = self.MARGIN_W + col * self.GRID_SIZE_W + 1
-            y = self.MARGIN_H + row * self.GRID_SIZE_H
-            pygame.draw.circle(screen, self.MARK_COLOR, (x, y), 6)
-
-        for piece in self.pieces:
-            if piece == self.selected_piece and self.dragging:
-                x, y = mouse_pos
-            else:
-                x = self.MARGIN_W + piece.position[0] * self.GRID_SIZE_W
-                y = self.MARGIN_H + piece.position[1] * self.GRID_SIZE_H
-            color = (255, 0, 0) if piece.color == "red" else (0, 0, 0)
-            pygame.draw.circle(screen, (255, 255, 255), (x, y), 30)  # White background
-            pygame.draw.circle(screen, color, (x, y), 30, 2)  # Colored border
-            text = self.font.render(piece.get_name(), True, color)
-            text_rect = text.get_rect(center=(x, y))
-            screen.blit(text, text_rect)
-
-    def get_state(self):
-        # 將棋盤狀態轉換為神經網絡的輸入格式
-        state = mx.zeros((9, 9, 10))
-        for piece in self.pieces:
-            x, y = piece.position
-            piece_type = type(piece).__name__
-            color = 1 if piece.color == "red" else -1
-            channel = self.piece_to_channel[piece_type]
-            state[channel, x, y] = color
-        return state
-
-    def get_legal_moves(self, color):
+    def get_legal_moves(self, color, captures_only=False):
         # 獲取所有合法移動
-        legal_moves = []
-        for piece in self.pieces:
-            if piece.color == color:
-                for x in range(9):
-                    for y in range(10):
-                        if piece.is_valid_move((x, y), self):
-                            legal_moves.append((piece.position, (x, y)))
-        return legal_moves
+        return list(self.iter_legal_moves(color, captures_only))
 
     def make_move(self, move):
+        if self.get_piece_at(move[0]):
+            self.push(move)
+
+    def push(self, move):
         from_pos, to_pos = move
         piece = self.get_piece_at(from_pos)
-        if piece:
-            captured_piece = self.get_piece_at(to_pos)
-            if captured_piece:
-                self.pieces.remove(captured_piece)
-            self.update_piece_position(piece, to_pos)
+        if piece is None:
+            raise ValueError(f"No piece at {from_pos}")
+        captured_piece = self.get_piece_at(to_pos)
+        captured_indices = None
+        previous_hash = self.hash
+        if captured_piece:
+            captured_indices = self.remove_piece(captured_piece)
+        self.update_piece_position(piece, to_pos)
+        # Undo record: (move, moved piece, captured piece, its list indices, hash before the move)
+        self.move_stack.append((move, piece, captured_piece, captured_indices, previous_hash))
+
+    def pop(self):
+        move, piece, captured_piece, captured_indices, previous_hash = self.move_stack.pop()
+        self.update_piece_position(piece, move[0])
+        if captured_piece:
+            self.add_piece(captured_piece, captured_indices)
+        self.hash = previous_hash
+        return move
 
     def is_game_over(self):
         return self.is_checkmate("red") or self.is_checkmate("black") or self.is_stalemate("red") or self.is_stalemate(
@@ -1,6 +1,125 @@
 from abc import ABC, abstractmethod
 
+# Squares are indexed as x + 9 * y on the 9 x 10 board. Tables that depend on
+# the side of the board are keyed by True for the bottom side, False for the top.
+SQUARE_POSITIONS = [(square % 9, square // 9) for square in range(90)]
+
+
+def _square(x, y):
+    if 0 <= x <= 8 and 0 <= y <= 9:
+        return x + 9 * y
+    return None
+
+
+def _in_palace(x, y, bottom):
+    return 3 <= x <= 5 and (7 <= y <= 9 if bottom else 0 <= y <= 2)
+
+
+def _build_step_table(steps, allowed):
+    table = {}
+    for bottom in (True, False):
+        moves = []
+        for x, y in SQUARE_POSITIONS:
+            moves.append([_square(x + dx, y + dy) for dx, dy in steps
+                          if _square(x + dx, y + dy) is not None and allowed(x + dx, y + dy, bottom)])
+        table[bottom] = moves
+    return table
+
+
+def _build_elephant_table():
+    table = {}
+    for bottom in (True, False):
+        moves = []
+        for x, y in SQUARE_POSITIONS:
+            targets = []
+            for dx, dy in ((2, 2), (2, -2), (-2, 2), (-2, -2)):
+                target = _square(x + dx, y + dy)
+                if target is not None and (y + dy >= 5) == bottom:
+                    targets.append((target, _square(x + dx // 2, y + dy // 2)))
+            moves.append(targets)
+        table[bottom] = moves
+    return table
+
+
+def _build_horse_table():
+    moves = []
+    for x, y in SQUARE_POSITIONS:
+        targets = []
+        for dx, dy in ((1, 2), (-1, 2), (1, -2), (-1, -2), (2, 1), (2, -1), (-2, 1), (-2, -1)):
+            target = _square(x + dx, y + dy)
+            if target is not None:
+                leg = _square(x + dx // 2, y) if abs(dx) == 2 else _square(x, y + dy // 2)
+                targets.append((target, leg))
+        moves.append(targets)
+    return moves
+
+
+def _build_rays():
+    rays = []
+    for x, y in SQUARE_POSITIONS:
+        rays.append([
+            [_square(x, ny) for ny in range(y - 1, -1, -1)],
+            [_square(x, ny) for ny in range(y + 1, 10)],
+            [_square(nx, y) for nx in range(x - 1, -1, -1)],
+            [_square(nx, y) for nx in range(x + 1, 9)],
+        ])
+    return rays
+
+
+def _build_soldier_table():
+    table = {}
+    for bottom in (True, False):
+        forward = -1 if bottom else 1
+        moves = []
+        for x, y in SQUARE_POSITIONS:
+            crossed = y <= 4 if bottom else y >= 5
+            steps = [(0, forward)] + ([(-1, 0), (1, 0)] if crossed else [])
+            moves.append([_square(x + dx, y + dy) for dx, dy in steps if _square(x + dx, y + dy) is not None])
+        table[bottom] = moves
+    return table
+
+
+ORTHOGONAL_STEPS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+DIAGONAL_STEPS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+GENERAL_MOVES = _build_step_table(ORTHOGONAL_STEPS, _in_palace)
+ADVISOR_MOVES = _build_step_table(DIAGONAL_STEPS, _in_palace)
+ELEPHANT_MOVES = _build_elephant_table()
+HORSE_MOVES = _build_horse_table()
+RAYS = _build_rays()
+SOLDIER_MOVES = _build_soldier_table()
+
+# Reverse tables for attack detection: squares a piece could attack `square` from.
+# Entries keep the blocking square (horse leg, elephant eye) next to the source.
+HORSE_ATTACKERS = [[] for _ in range(90)]
+for _source, _targets in enumerate(HORSE_MOVES):
+    for _target, _leg in _targets:
+        HORSE_ATTACKERS[_target].append((_source, _leg))
+
+
+def _invert_table(table, blocked=False):
+    inverted = {}
+    for bottom, moves in table.items():
+        attackers = [[] for _ in range(90)]
+        for source, targets in enumerate(moves):
+            for entry in targets:
+                if blocked:
+                    attackers[entry[0]].append((source, entry[1]))
+                else:
+                    attackers[entry].append(source)
+        inverted[bottom] = attackers
+    return inverted
+
+
+GENERAL_ATTACKERS = _invert_table(GENERAL_MOVES)
+ADVISOR_ATTACKERS = _invert_table(ADVISOR_MOVES)
+ELEPHANT_ATTACKERS = _invert_table(ELEPHANT_MOVES, blocked=True)
+SOLDIER_ATTACKERS = _invert_table(SOLDIER_MOVES)
+
+
 class ChessPiece(ABC):
+    code = 0  # Mailbox value, signed by color on the board
+
     def __init__(self, color, position):
         self.color = color
         self.position = position
@@ -10,112 +129,143 @@ class ChessPiece(ABC):
         pass
 
     @abstractmethod
-    def is_valid_move(self, new_position, board):
+    def target_squares(self, board):
         pass
 
+    def is_valid_move(self, new_position, board):
+        x, y = new_position
+        if not (0 <= x <= 8 and 0 <= y <= 9):
+            return False
+        return x + 9 * y in self.target_squares(board)
+
+    def square(self):
+        x, y = self.position
+        return x + 9 * y
+
+    def sign(self):
+        return 1 if self.color == "red" else -1
+
+    def is_at_bottom(self, board):
+        return (self.color == "red") == board.red_at_bottom
+
+    def _step_targets(self, board, targets):
+        mailbox = board.mailbox
+        sign = self.sign()
+        return [target for target in targets if mailbox[target] * sign <= 0]
+
 class General(ChessPiece):
+    code = 1
+
     def get_name(self):
         return "帥" if self.color == "red" else "將"
 
-    def is_valid_move(self, new_position, board):
-        if not board.is_within_palace(new_position, self.color):
-            return False
-        dx = abs(new_position[0] - self.position[0])
-        dy = abs(new_position[1] - self.position[1])
-        if (dx == 1 and dy == 0) or (dx == 0 and dy == 1):
-            return not board.is_general_facing_general(new_position)
-        return False
+    def target_squares(self, board):
+        targets = self._step_targets(board, GENERAL_MOVES[self.is_at_bottom(board)][self.square()])
+        enemy_general = board.generals["black" if self.color == "red" else "red"]
+        if not enemy_general:
+            return targets
+        # Generals may not face each other on an open file
+        x, y = self.position
+        enemy_x, enemy_y = enemy_general.position
+        safe_targets = []
+        for target in targets:
+            target_x, target_y = SQUARE_POSITIONS[target]
+            if target_x == enemy_x:
+                blockers = board.count_pieces_between((target_x, target_y), enemy_general.position)
+                if x == enemy_x and abs(target_y - enemy_y) > abs(y - enemy_y):
+                    blockers -= 1  # Our own origin square empties behind us
+                if blockers == 0:
+                    continue
+            safe_targets.append(target)
+        return safe_targets
 
 class Advisor(ChessPiece):
+    code = 2
+
     def get_name(self):
         return "仕" if self.color == "red" else "士"
 
-    def is_valid_move(self, new_position, board):
-        if not board.is_within_palace(new_position, self.color):
-            return False
-        dx = abs(new_position[0] - self.position[0])
-        dy = abs(new_position[1] - self.position[1])
-        return dx == 1 and dy == 1
+    def target_squares(self, board):
+        return self._step_targets(board, ADVISOR_MOVES[self.is_at_bottom(board)][self.square()])
 
 class Elephant(ChessPiece):
+    code = 3
+
     def get_name(self):
         return "相" if self.color == "red" else "象"
 
-    def is_valid_move(self, new_position, board):
-        if ((self.color == "red") == board.red_at_bottom) == (new_position[1] < 5):
-            return False
-        dx = abs(new_position[0] - self.position[0])
-        dy = abs(new_position[1] - self.position[1])
-        if dx != 2 or dy != 2:
-            return False
-        eye_x = (self.position[0] + new_position[0]) // 2
-        eye_y = (self.position[1] + new_position[1]) // 2
-        return not board.is_piece_at((eye_x, eye_y))
+    def target_squares(self, board):
+        mailbox = board.mailbox
+        sign = self.sign()
+        return [target for target, eye in ELEPHANT_MOVES[self.is_at_bottom(board)][self.square()]
+                if not mailbox[eye] and mailbox[target] * sign <= 0]
 
 class Horse(ChessPiece):
+    code = 4
+
     def get_name(self):
         return "馬"
 
-    def is_valid_move(self, new_position, board):
-        dx = abs(new_position[0] - self.position[0])
-        dy = abs(new_position[1] - self.position[1])
-        if (dx == 2 and dy == 1) or (dx == 1 and dy == 2):
-            # Check if the horse's leg is blocked
-            leg_x = self.position[0] + (1 if new_position[0] > self.position[0] else -1) if dx == 2 else self.position[0]
-            leg_y = self.position[1] + (1 if new_position[1] > self.position[1] else -1) if dy == 2 else self.position[1]
-            return not board.is_piece_at((leg_x, leg_y))
-        return False
+    def target_squares(self, board):
+        mailbox = board.mailbox
+        sign = self.sign()
+        # A piece on the leg square blocks the jump
+        return [target for target, leg in HORSE_MOVES[self.square()]
+                if not mailbox[leg] and mailbox[target] * sign <= 0]
 
 class Chariot(ChessPiece):
+    code = 5
+
     def get_name(self):
         return "車" if self.color == "red" else "俥"
 
-    def is_valid_move(self, new_position, board):
-        dx = new_position[0] - self.position[0]
-        dy = new_position[1] - self.position[1]
-        return (dx == 0 or dy == 0) and board.is_path_clear(self.position, new_position)
+    def target_squares(self, board):
+        mailbox = board.mailbox
+        sign = self.sign()
+        targets = []
+        for ray in RAYS[self.square()]:
+            for target in ray:
+                value = mailbox[target]
+                if not value:
+                    targets.append(target)
+                    continue
+                if value * sign < 0:
+                    targets.append(target)
+                break
+        return targets
 
 class Cannon(ChessPiece):
+    code = 6
+
     def get_name(self):
         return "炮" if self.color == "red" else "砲"
 
-    def is_valid_move(self, new_position, board):
-        if not board.is_within_board(new_position):
-            return False
-
-        dx = new_position[0] - self.position[0]
-        dy = new_position[1] - self.position[1]
-
-        if dx == 0 or dy == 0:  # Move in straight line
-            pieces_between = board.count_pieces_between(self.position, new_position)
-            target_piece = board.get_piece_at(new_position)
-
-            if target_piece:
-                # Capture: must jump over exactly one piece
-                return pieces_between == 1 and target_piece.color != self.color
-            else:
-                # Move: path must be clear
-                return pieces_between == 0
-
-        return False
+    def target_squares(self, board):
+        mailbox = board.mailbox
+        sign = self.sign()
+        targets = []
+        for ray in RAYS[self.square()]:
+            screened = False
+            for target in ray:
+                value = mailbox[target]
+                if not screened:
+                    if not value:
+                        targets.append(target)
+                    else:
+                        screened = True
+                elif value:
+                    # Capture: must jump over exactly one piece
+                    if value * sign < 0:
+                        targets.append(target)
+                    break
+        return targets
 
 
 class Soldier(ChessPiece):
+    code = 7
+
     def get_name(self):
         return "兵" if self.color == "red" else "卒"
 
-    def is_valid_move(self, new_position, board):
-        dx = new_position[0] - self.position[0]
-        dy = new_position[1] - self.position[1]
-        forward = -1 if (self.color == "red") == board.red_at_bottom else 1
-
-        if (self.color == "red") == board.red_at_bottom:
-            if self.position[1] > 4:  # Not crossed river
-                return dx == 0 and dy == forward
-            else:  # Crossed river
-                return (dx == 0 and dy == forward) or (abs(dx) == 1 and dy == 0)
-        else:
-            if self.position[1] < 5:  # Not crossed river
-                return dx == 0 and dy == forward
-            else:  # Crossed river
-                return (dx == 0 and dy == forward) or (abs(dx) == 1 and dy == 0)
\ No newline at end of file
+    def target_squares(self, board):
+        return self._step_targets(board, SOLDIER_MOVES[self.is_at_bottom(board)][self.square()])
@@ -0,0 +1,93 @@
+import queue
+import threading
+import numpy as np
+from ai import game_positions
+from chess_board import NUM_PLANES
+from replay_buffer import ReplayBuffer, POLICY_ENTRIES, record_dtype, fill_record, dense_policy
+
+def positions_array(games, policy_entries=POLICY_ENTRIES):
+    # Every position of a list of self-play records as replay buffer records
+    rows = [position for game in games for position in game_positions(game)]
+    if not rows:
+        return np.empty(0, dtype=record_dtype((NUM_PLANES, 10, 9), policy_entries))
+    records = np.zeros(len(rows), dtype=record_dtype(rows[0][0].shape, policy_entries))
+    for record, position in zip(records, rows):
+        fill_record(record, *position)
+    return records
+
+class MinibatchLoader:
+    # Iterates fixed-size (planes, policy_targets, value_targets) numpy minibatches.
+    # A background thread builds the next `prefetch` batches while the caller trains.
+    # `source` is a ReplayBuffer, sampled uniformly for `steps` batches, or a list of
+    # game records, shuffled across games and walked for one epoch unless `steps` is set.
+    def __init__(self, source, batch_size=256, steps=None, prefetch=2, seed=None):
+        self.source = source
+        self.batch_size = batch_size
+        self.steps = steps
+        self.prefetch = prefetch
+        self.rng = np.random.default_rng(seed)
+        if not isinstance(source, ReplayBuffer):
+            self.source = positions_array(source)
+
+    def __len__(self):
+        if self.steps is not None:
+            return self.steps
+        if isinstance(self.source, ReplayBuffer):
+            return max(1, len(self.source) // self.batch_size)
+        # Short datasets give one smaller batch, otherwise every batch is full
+        return max(len(self.source) // self.batch_size, min(len(self.source), 1))
+
+    def record_batches(self):
+        if isinstance(self.source, ReplayBuffer):
+            for _ in range(len(self)):
+                yield self.source.sample(self.batch_size, self.rng)
+            return
+        records = self.source
+        if not len(records):
+            return
+        batch_size = min(self.batch_size, len(records))
+        produced = 0
+        while produced < len(self):
+            order = self.rng.permutation(len(records))
+            for start in range(0, len(order) - batch_size + 1, batch_size):
+                yield records[np.sort(order[start:start + batch_size])]
+                produced += 1
+                if produced == len(self):
+                    return
+
+    def put(self, batches, item, stop):
+        # Gives up once the consumer has stopped, so a full queue cannot block join()
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(self, batches, stop):
+        try:
+            for batch in self.record_batches():
+                if not self.put(batches, (batch["planes"], dense_policy(batch), batch["value"]), stop):
+                    return
+        except Exception as error:
+            self.put(batches, error, stop)
+            return
+        self.put(batches, None, stop)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(target=self.produce, args=(batches, stop), daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            worker.join()
@@ -0,0 +1,59 @@
+import sys
+from array import array
+from collections import OrderedDict
+
+# Rough per-entry cost of the OrderedDict slot, key, value tuple and float
+ENTRY_OVERHEAD = 100 + sys.getsizeof(1 << 63) + sys.getsizeof((None, None, 0.0)) + sys.getsizeof(0.0)
+
+
+class EvaluationCache:
+    # Maps a position key (side to move included) to the network's priors over
+    # the legal moves and its value. Only share between searches whose models
+    # have identical weights, and clear it when those weights change.
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, policy_indices, priors, value):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        entry = (array('H', policy_indices), array('f', priors), value)
+        self.entries[key] = entry
+        self.bytes += self.entry_bytes(entry)
+        while self.bytes > self.max_bytes and self.entries:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= self.entry_bytes(evicted)
+            self.evictions += 1
+
+    def entry_bytes(self, entry):
+        return sys.getsizeof(entry[0]) + sys.getsizeof(entry[1]) + ENTRY_OVERHEAD
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -1,9 +1,13 @@
 import pygame
 import sys
-import os
-import mlx.core as mx
 from chess_board import ChessBoard
-from ai import ChessNet, MCTS, train_network
+from board_view import BoardView
+from ai import ChessNet, MCTS, train_network, create_optimizer
+from data_loader import MinibatchLoader
+from evaluation_cache import EvaluationCache
+from alphabeta import AlphaBetaSearch
+from replay_buffer import ReplayBuffer
+from checkpoint import CheckpointManager
 
 class GameWindow:
     def __init__(self, width, height):
@@ -15,32 +19,53 @@ class GameWindow:
         self.font = pygame.font.Font(None, 36)
         self.mode = None
         self.board = None
+        self.view = BoardView(width, height)
         self.current_player = None
         self.game_over = False
         self.winner = None
         self.setup_mode_selection()
         self.ai_training = False
         self.ai_game_count = 0
-        self.model_red = ChessNet()
-        self.model_black = ChessNet()
-        self.mcts_red = MCTS(self.model_red)
-        self.mcts_black = MCTS(self.model_black)
+        # Networks are only built for AI training, see load_models
+        self.model_red = None
+        self.model_black = None
+        self.checkpoints = None
+
+    def load_models(self):
+        # Resumes from the newest saved versions, or starts from random weights
+        if self.model_red is not None:
+            return
+        self.checkpoints = CheckpointManager()
+        red_path = self.checkpoints.latest("model_red")
+        black_path = self.checkpoints.latest("model_black")
+        self.model_red = ChessNet.load(red_path) if red_path else ChessNet()
+        self.model_black = ChessNet.load(black_path) if black_path else ChessNet()
+        # Optimizer state carries over from one training round to the next
+        self.optimizer_red = create_optimizer()
+        self.optimizer_black = create_optimizer()
+        # Both searches can share one evaluation cache only if they share weights
+        red_cache = EvaluationCache()
+        black_cache = red_cache if self.model_black is self.model_red else EvaluationCache()
+        self.mcts_red = MCTS(self.model_red, evaluation_cache=red_cache)
+        self.mcts_black = MCTS(self.model_black, evaluation_cache=black_cache)
 
     def start_ai_training(self):
+        self.load_models()
         self.ai_training = True
         self.training_games = []
+        # Every finished game is also kept on disk so the data outlives the session
+        self.replay_buffer = ReplayBuffer()
         self.ai_game_count = 0
-        self.board = ChessBoard(self.width, self.height)
+        self.board = ChessBoard()
         self.current_player = "red"
+        self.game_record = {"moves": [], "policies": [], "winner": None}
 
     def play_ai_vs_ai_game(self):
         if not self.board.is_game_over():
-            state = self.board.get_state()
-            legal_moves = self.board.get_legal_moves(self.current_player)
-            if self.current_player == "red":
-                action = self.mcts_red.get_action(state, legal_moves, "red")
-            else:
-                action = self.mcts_black.get_action(state, legal_moves, "black")
+            mcts = self.mcts_red if self.current_player == "red" else self.mcts_black
+            action = mcts.get_action(self.board, self.current_player)
+            self.game_record["moves"].append(action)
+            self.game_record["policies"].append(mcts.last_visits)
 
             # 执行移动
             self.board.make_move(action)
@@ -54,14 +79,23 @@ class GameWindow:
             pygame.time.wait(500)  # 添加短暂延迟，使得棋局变化可见
         else:
             # 游戏结束，记录游戏状态并开始新游戏
-            self.training_games.append(self.board.get_game_history())
+            # The side to move cannot move, so the other side won
+            self.game_record["winner"] = self.get_opposite_color(self.current_player)
+            self.training_games.append(self.game_record)
+            self.replay_buffer.add_game(self.game_record)
             self.ai_game_count += 1
-            self.board = ChessBoard(self.width, self.height)
+            self.board = ChessBoard()
             self.current_player = "red"
+            self.game_record = {"moves": [], "policies": [], "winner": None}
+            self.mcts_red.reset()
+            self.mcts_black.reset()
 
             if self.ai_game_count % 10 == 0:  # 每10局游戏训练一次
-                train_network(self.model_red, self.training_games)
-                train_network(self.model_black, self.training_games)
+                train_network(self.model_red, self.optimizer_red, MinibatchLoader(self.training_games))
+                train_network(self.model_black, self.optimizer_black, MinibatchLoader(self.training_games))
+                # Cached evaluations are stale once the weights change
+                self.mcts_red.evaluation_cache.clear()
+                self.mcts_black.evaluation_cache.clear()
                 self.save_models()
                 self.training_games = []  # 清空训练游戏列表
 
@@ -72,21 +106,6 @@ class GameWindow:
             {"text": "AI Training", "rect": pygame.Rect(250, 440, 300, 50), "color": (200, 200, 200)}
         ]
 
-    def play_ai_game(self):
-        self.board = ChessBoard(self.width, self.height)
-        game_states = []
-        current_player = "red"
-
-        while not self.board.is_game_over():
-            state = self.board.get_state()
-            legal_moves = self.board.get_legal_moves(current_player)
-            action = self.mcts.get_action(state, legal_moves)
-            self.board.make_move(action)
-            game_states.append((state, action, current_player))
-            current_player = self.get_opposite_color(current_player)
-
-        return game_states
-
     def draw_mode_selection(self):
         self.screen.fill((255, 255, 255))
         for button in self.buttons:
@@ -103,14 +122,17 @@ class GameWindow:
                     self.mode = "human_vs_human"
                     self.start_game()
                 elif button["text"] == "Human vs AI":
-                    print("Human vs AI mode not implemented yet")
+                    self.mode = "human_vs_ai"
+                    self.ai_color = "black"
+                    self.engine = AlphaBetaSearch()
+                    self.start_game()
                 elif button["text"] == "AI Training":
                     self.mode = "ai_training"
                     self.start_ai_training()
 
     def start_game(self):
         self.red_at_bottom = True
-        self.board = ChessBoard(self.width, self.height, self.red_at_bottom)
+        self.board = ChessBoard(self.red_at_bottom)
         self.current_player = "red"
         self.game_over = False
 
@@ -118,7 +140,10 @@ class GameWindow:
         if self.game_over:
             self.red_at_bottom = not self.red_at_bottom
             self.current_player = "black" if self.current_player == "red" else "red"
-        self.board = ChessBoard(self.width, self.height, self.red_at_bottom)
+        if self.mode == "human_vs_ai":
+            # Red always moves first against the engine, which plays black
+            self.current_player = "red"
+        self.board = ChessBoard(self.red_at_bottom)
         self.game_over = False
 
     def run(self):
@@ -133,9 +158,10 @@ class GameWindow:
                         self.handle_mode_selection(event.pos)
                     elif self.game_over:
                         self.reset_game()
-                    elif event.button == 1 and self.mode == "human_vs_human":  # Left mouse button
+                    elif event.button == 1 and self.mode in ("human_vs_human", "human_vs_ai"):  # Left mouse button
                         self.handle_game_click(event.pos)
-                elif event.type == pygame.MOUSEBUTTONUP and not self.game_over and self.mode == "human_vs_human":
+                elif event.type == pygame.MOUSEBUTTONUP and not self.game_over and \
+                        self.mode in ("human_vs_human", "human_vs_ai"):
                     if event.button == 1:  # Left mouse button
                         self.handle_game_release(event.pos)
 
@@ -143,6 +169,10 @@ class GameWindow:
                 self.draw_mode_selection()
             elif self.mode == "human_vs_human":
                 self.draw_game()
+            elif self.mode == "human_vs_ai":
+                self.draw_game()
+                if not self.game_over and self.current_player == self.ai_color:
+                    self.play_engine_move()
             elif self.mode == "ai_training" and self.ai_training:
                 self.play_ai_vs_ai_game()
                 self.draw_ai_training_info()
@@ -151,52 +181,58 @@ class GameWindow:
             clock.tick(60)
 
     def handle_game_click(self, pos):
-        piece = self.board.get_piece_at_pos(pos)
+        piece = self.view.get_piece_at_pos(self.board, pos)
         if piece and piece.color == self.current_player:
-            self.board.selected_piece = piece
-            self.board.dragging = True
+            self.view.selected_piece = piece
+            self.view.dragging = True
 
     def handle_game_release(self, pos):
-        self.board.dragging = False
-        if self.board.selected_piece:
-            new_pos = self.get_board_position(pos)
-            if new_pos and self.board.selected_piece.is_valid_move(new_pos, self.board):
+        self.view.dragging = False
+        if self.view.selected_piece:
+            new_pos = self.view.get_board_position(pos)
+            # Fully legal moves only, so a human cannot leave their own general en prise
+            move = (self.view.selected_piece.position, new_pos)
+            if new_pos and move in self.board.get_legal_moves(self.current_player):
                 self.make_move(new_pos)
-            self.board.selected_piece = None
+            self.view.selected_piece = None
 
     def draw_game(self):
-        self.board.draw(self.screen, pygame.mouse.get_pos())
+        self.view.draw(self.screen, self.board, pygame.mouse.get_pos())
         self.draw_current_player()
         if self.game_over:
             self.draw_game_over_message()
         pygame.display.flip()
 
     def make_move(self, new_pos):
-        original_position = self.board.selected_piece.position
-        captured_piece = self.board.get_piece_at(new_pos)
-        if captured_piece:
-            self.board.pieces.remove(captured_piece)
-        self.board.update_piece_position(self.board.selected_piece, new_pos)
+        original_position = self.view.selected_piece.position
+        self.board.push((original_position, new_pos))
 
         if self.board.is_general_captured():
             self.game_over = True
             self.winner = self.get_opposite_color(self.current_player)
-        elif self.board.is_general_facing_general(new_pos):
+        elif self.board.is_general_facing_general():
             self.game_over = True
             self.winner = self.get_opposite_color(self.current_player)
+        elif not self.board.has_legal_move(self.get_opposite_color(self.current_player)):
+            # Checkmate or stalemate, both lost for the side that cannot move
+            self.game_over = True
+            self.winner = self.current_player
         else:
             self.current_player = self.get_opposite_color(self.current_player)
 
+    def play_engine_move(self):
+        action = self.engine.get_action(self.board, self.current_player)
+        if action is None:
+            self.game_over = True
+            self.winner = self.get_opposite_color(self.current_player)
+            return
+        self.view.selected_piece = self.board.get_piece_at(action[0])
+        self.make_move(action[1])
+        self.view.selected_piece = None
+
     def get_opposite_color(self, color):
         return "black" if color == "red" else "red"
 
-    def get_board_position(self, screen_pos):
-        x = round((screen_pos[0] - self.board.MARGIN_W) / self.board.GRID_SIZE_W)
-        y = round((screen_pos[1] - self.board.MARGIN_H) / self.board.GRID_SIZE_H)
-        if 0 <= x <= 8 and 0 <= y <= 9:
-            return (x, y)
-        return None
-
     def draw_ai_training_info(self):
         info_surface = pygame.Surface((200, 100))
         info_surface.fill((255, 255, 255))
@@ -208,11 +244,11 @@ class GameWindow:
         self.screen.blit(info_surface, (self.width - 210, 10))
 
     def save_models(self):
-        if not os.path.exists('models'):
-            os.makedirs('models')
-        mx.save('models/model_red.npz', self.model_red.parameters())
-        mx.save('models/model_black.npz', self.model_black.parameters())
-        print(f"Models saved after {self.ai_game_count} games")
+        # Written on a background thread, so the training loop and UI keep going
+        metadata = {"games": str(self.ai_game_count)}
+        self.checkpoints.save(self.model_red, "model_red", metadata)
+        self.checkpoints.save(self.model_black, "model_black", metadata)
+        print(f"Saving models after {self.ai_game_count} games")
 
     def draw_current_player(self):
         text = self.font.render(f"Current Player: {self.current_player.capitalize()}", True, (0, 0, 0))
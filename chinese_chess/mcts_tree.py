@@ -0,0 +1,125 @@
+import numpy as np
+
+
+class MCTSTree:
+    # Struct-of-arrays search tree. Node i is the edge reached by playing move[i]
+    # from parent[i]; its children occupy first_child[i] .. first_child[i] + num_children[i].
+    # Nodes hold no board state, the search replays moves with push/pop instead.
+    def __init__(self, max_nodes=1 << 20):
+        self.max_nodes = max_nodes
+        self.visits = np.zeros(max_nodes, dtype=np.int32)
+        self.value_sum = np.zeros(max_nodes, dtype=np.float32)
+        self.prior = np.zeros(max_nodes, dtype=np.float32)
+        self.parent = np.full(max_nodes, -1, dtype=np.int32)
+        self.first_child = np.full(max_nodes, -1, dtype=np.int32)
+        self.num_children = np.zeros(max_nodes, dtype=np.int16)
+        self.move = np.zeros(max_nodes, dtype=np.int16)  # Policy index of the move into this node
+        self.key = np.zeros(max_nodes, dtype=np.uint64)  # Position key, 0 until first visited
+        self.size = 0
+
+    def clear(self):
+        # Allocation initialises every field, so dropping the size is enough
+        self.size = 0
+
+    def add_root(self, key):
+        if self.size >= self.max_nodes:
+            return -1
+        node = self.size
+        self.size += 1
+        self.visits[node] = 0
+        self.value_sum[node] = 0
+        self.prior[node] = 0
+        self.parent[node] = -1
+        self.first_child[node] = -1
+        self.num_children[node] = 0
+        self.move[node] = 0
+        self.key[node] = key
+        return node
+
+    def can_expand(self, count):
+        return self.size + count <= self.max_nodes
+
+    def expand(self, node, moves, priors):
+        # Allocates one contiguous child block; returns False when the tree is full
+        count = len(moves)
+        if self.first_child[node] != -1 or not self.can_expand(count):
+            return False
+        start = self.size
+        end = start + count
+        self.visits[start:end] = 0
+        self.value_sum[start:end] = 0
+        self.prior[start:end] = priors
+        self.parent[start:end] = node
+        self.first_child[start:end] = -1
+        self.num_children[start:end] = 0
+        self.move[start:end] = moves
+        self.key[start:end] = 0
+        self.first_child[node] = start
+        self.num_children[node] = count
+        self.size = end
+        return True
+
+    def share_children(self, node, other):
+        # Transposition: reuse the child block (and its statistics) of `other`
+        self.first_child[node] = self.first_child[other]
+        self.num_children[node] = self.num_children[other]
+
+    def is_expanded(self, node):
+        return self.first_child[node] != -1
+
+    def children(self, node):
+        start = int(self.first_child[node])
+        if start < 0:
+            return range(0)
+        return range(start, start + int(self.num_children[node]))
+
+    def retain_subtree(self, root):
+        # Compacts the nodes reachable from `root` to the front of the arrays, root
+        # first and child blocks kept contiguous; everything else is freed.
+        mapping = np.full(self.size, -1, dtype=np.int64)
+        mapping[root] = 0
+        order = [root]
+        new_first_child = [-1]
+        index = 0
+        while index < len(order):
+            node = order[index]
+            start = int(self.first_child[node])
+            count = int(self.num_children[node])
+            if start >= 0:
+                block = mapping[start:start + count]
+                if block[0] == -1 and (block == -1).all():
+                    mapping[start:start + count] = np.arange(len(order), len(order) + count)
+                    new_first_child[index] = len(order)
+                    order.extend(range(start, start + count))
+                    new_first_child.extend([-1] * count)
+                elif (block == block[0] + np.arange(count)).all():
+                    new_first_child[index] = int(block[0])  # Block shared through a transposition
+                # A block split by the new root (a repetition cycle) is dropped
+            index += 1
+
+        order = np.array(order, dtype=np.int64)
+        count = len(order)
+        parents = self.parent[order]
+        for array in (self.visits, self.value_sum, self.prior, self.num_children, self.move, self.key):
+            array[:count] = array[order]
+        self.first_child[:count] = new_first_child
+        self.num_children[:count][self.first_child[:count] == -1] = 0
+        self.parent[:count] = np.where(parents >= 0, mapping[np.maximum(parents, 0)], -1)
+        self.parent[0] = -1
+        self.size = count
+
+    def expanded_nodes(self):
+        return np.flatnonzero(self.first_child[:self.size] != -1)
+
+    def memory_bytes(self):
+        return (self.visits.nbytes + self.value_sum.nbytes + self.prior.nbytes + self.parent.nbytes
+                + self.first_child.nbytes + self.num_children.nbytes + self.move.nbytes + self.key.nbytes)
+
+    def stats(self):
+        return {
+            "nodes": self.size,
+            "max_nodes": self.max_nodes,
+            "fill": self.size / self.max_nodes,
+            "memory_bytes": self.memory_bytes(),
+            "bytes_per_node": self.memory_bytes() / self.max_nodes,
+        }
@@ -0,0 +1,49 @@
+from array import array
+from chess_pieces import SQUARE_POSITIONS, RAYS, HORSE_MOVES
+
+# Dense index over every move some piece could ever make on an empty board:
+# file and rank moves (chariot, cannon, general, soldier), horse jumps, and the
+# diagonal steps between the points advisors and elephants can stand on.
+ADVISOR_POINTS = [(3, 0), (5, 0), (4, 1), (3, 2), (5, 2), (3, 7), (5, 7), (4, 8), (3, 9), (5, 9)]
+ELEPHANT_POINTS = [(2, 0), (6, 0), (0, 2), (4, 2), (8, 2), (2, 4), (6, 4),
+                   (2, 5), (6, 5), (0, 7), (4, 7), (8, 7), (2, 9), (6, 9)]
+
+
+def _diagonal_moves(points, step):
+    # Steps of exactly `step` along a diagonal without crossing the river
+    moves = []
+    for fx, fy in points:
+        for tx, ty in points:
+            if abs(tx - fx) == step and abs(ty - fy) == step and (fy >= 5) == (ty >= 5):
+                moves.append((fx + 9 * fy, tx + 9 * ty))
+    return moves
+
+
+def _build_moves():
+    moves = set()
+    for square in range(90):
+        for ray in RAYS[square]:
+            moves.update((square, target) for target in ray)
+        moves.update((square, target) for target, _ in HORSE_MOVES[square])
+    moves.update(_diagonal_moves(ADVISOR_POINTS, 1))
+    moves.update(_diagonal_moves(ELEPHANT_POINTS, 2))
+    return sorted(moves)
+
+
+# MOVES[index] is a (from_square, to_square) pair; MOVE_INDEX[from_square * 90 + to_square]
+# is its index, or -1 for moves no piece can make
+MOVES = _build_moves()
+NUM_MOVES = len(MOVES)
+MOVE_INDEX = array('h', [-1] * (90 * 90))
+for _index, (_from_square, _to_square) in enumerate(MOVES):
+    MOVE_INDEX[_from_square * 90 + _to_square] = _index
+
+
+def move_index(move):
+    (from_x, from_y), (to_x, to_y) = move
+    return MOVE_INDEX[(from_x + 9 * from_y) * 90 + to_x + 9 * to_y]
+
+
+def index_move(index):
+    from_square, to_square = MOVES[index]
+    return SQUARE_POSITIONS[from_square], SQUARE_POSITIONS[to_square]
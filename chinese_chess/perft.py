@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import sys
+import time
+from chess_board import ChessBoard
+
+START_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w"
+
+# Reference leaf counts by depth, starting at depth 1
+PERFT_POSITIONS = [
+    ("start", START_FEN, [44, 1920, 79666, 3290240, 133312995]),
+    ("midgame1", "r1ba1a3/4kn3/2n1b4/pNp1p1p1p/4c4/6P2/P1P2R2P/1CcC5/9/2BAKAB2 w", [38, 1128, 43929, 1339047]),
+    ("midgame2", "1cbak4/9/n2a5/2p1p3p/5cp2/2n2N3/6PCP/3AB4/2C6/3A1K1N1 w", [7, 281, 8620, 326201]),
+    ("midgame3", "1C2ka3/9/C1Nab1n2/p3p3p/6p2/9/P3P3P/3AB4/3p2c2/c1BAK4 w", [30, 830, 22787, 649866]),
+    ("endgame1", "CnN1k1b2/c3a4/4ba3/9/2nr5/9/9/4C4/4A4/4KA3 w", [19, 583, 11714, 376467]),
+]
+
+# Absolute nodes/s measured on one machine, so the speed gate is opt-in (--check-speed)
+# and only means something on the host that recorded it with --update-baseline
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perft_baseline.json")
+
+def perft(board, depth, color):
+    if depth == 0:
+        return 1
+    moves = board.get_legal_moves(color)
+    if depth == 1:
+        return len(moves)
+    enemy_color = "black" if color == "red" else "red"
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1, enemy_color)
+        board.pop()
+    return nodes
+
+def divide(board, depth, color):
+    enemy_color = "black" if color == "red" else "red"
+    counts = {}
+    for move in board.get_legal_moves(color):
+        board.push(move)
+        counts[move] = perft(board, depth - 1, enemy_color)
+        board.pop()
+    return counts
+
+def run_suite(max_depth, time_limit=None):
+    # Returns (results, failures); each result is (name, depth, nodes, expected, seconds)
+    results = []
+    failures = []
+    for name, fen, expected_counts in PERFT_POSITIONS:
+        board = ChessBoard()
+        color = board.set_fen(fen)
+        for depth in range(1, min(max_depth, len(expected_counts)) + 1):
+            start = time.perf_counter()
+            nodes = perft(board, depth, color)
+            elapsed = time.perf_counter() - start
+            expected = expected_counts[depth - 1]
+            results.append((name, depth, nodes, expected, elapsed))
+            if nodes != expected:
+                failures.append(f"{name} depth {depth}: got {nodes}, expected {expected}")
+            if time_limit is not None and elapsed > time_limit:
+                break
+    return results, failures
+
+def nodes_per_second(results):
+    nodes = sum(result[2] for result in results)
+    seconds = sum(result[4] for result in results)
+    return nodes / seconds if seconds else 0.0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count move-generation leaf nodes and check them against reference counts")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth per position")
+    parser.add_argument("--fen", help="run a single position instead of the suite")
+    parser.add_argument("--divide", action="store_true", help="with --fen, print per-move counts")
+    parser.add_argument("--time-limit", type=float,
+                        help="seconds; stop deepening a position once one depth takes longer")
+    parser.add_argument("--check-speed", action="store_true",
+                        help="also fail when slower than the stored baseline (recorded on this host)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the measured speed as the new baseline; run it on each host that uses the gate")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="with --check-speed, allowed slowdown against the baseline (fraction)")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        board = ChessBoard()
+        color = board.set_fen(args.fen)
+        start = time.perf_counter()
+        if args.divide:
+            counts = divide(board, args.depth, color)
+            for move, count in sorted(counts.items()):
+                print(f"{move[0]} -> {move[1]}: {count}")
+            nodes = sum(counts.values())
+        else:
+            nodes = perft(board, args.depth, color)
+        elapsed = time.perf_counter() - start
+        print(f"depth {args.depth}: {nodes} nodes in {elapsed:.3f}s ({nodes / elapsed:,.0f} nodes/s)")
+        return 0
+
+    results, failures = run_suite(args.depth, args.time_limit)
+    for name, depth, nodes, expected, elapsed in results:
+        status = "ok" if nodes == expected else f"MISMATCH (expected {expected})"
+        print(f"{name:<12} depth {depth}: {nodes:>10} nodes {elapsed:8.3f}s  {status}")
+    speed = nodes_per_second(results)
+    print(f"Total: {speed:,.0f} nodes/s")
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+    key = f"depth{args.depth}"
+    if args.update_baseline:
+        baseline[key] = speed
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline for {key} set to {speed:,.0f} nodes/s")
+    elif args.check_speed and key in baseline:
+        floor = baseline[key] * (1 - args.tolerance)
+        print(f"Baseline: {baseline[key]:,.0f} nodes/s (failing below {floor:,.0f})")
+        if speed < floor:
+            failures.append(f"throughput regression: {speed:,.0f} nodes/s < {floor:,.0f} nodes/s")
+    elif args.check_speed:
+        print(f"No {key} baseline to check against, record one with --update-baseline")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import argparse
+import os
+import random
+import time
+import numpy as np
+import mlx.core as mx
+from ai import ChessNet, encode_state, policy_index
+from chess_board import ChessBoard
+from move_encoding import NUM_MOVES
+from checkpoint import save_weights
+
+# Post-training quantization of ChessNet checkpoints for CPU self-play workers.
+# int8 stores every weight tensor as symmetric int8 with one float32 scale per
+# output channel; fp16 halves every weight. Biases stay float32 in int8 mode.
+# ChessNet.load reads either format and dequantizes inside the inference graph.
+
+def quantize_weights(weights, mode):
+    quantized = {}
+    for name, value in weights.items():
+        if mode == "fp16":
+            quantized[name] = value.astype(mx.float16)
+        elif mode == "int8" and value.ndim > 1:
+            channels = value.reshape(value.shape[0], -1)
+            scale = mx.max(mx.abs(channels), axis=1) / 127
+            scale = mx.where(scale > 0, scale, 1.0)
+            quantized[name] = mx.clip(mx.round(channels / scale[:, None]), -127, 127).astype(mx.int8).reshape(value.shape)
+            quantized[name + "_scale"] = scale
+        elif mode == "int8":
+            quantized[name] = value
+        else:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+    return quantized
+
+def quantize_checkpoint(path, output, mode):
+    weights = mx.load(path)
+    if any(name.endswith("_scale") or value.dtype != mx.float32 for name, value in weights.items()):
+        raise ValueError(f"{path} is already quantized")
+    save_weights(output, quantize_weights(weights, mode), {"quantization": mode})
+
+def weight_bytes(model):
+    return sum(value.nbytes for value in model.parameters().values())
+
+def held_out_positions(count, seed=12345):
+    # Positions from seeded random playouts; self-play never sees these exact games
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = ChessBoard()
+        color = "red"
+        for _ in range(rng.randint(0, 120)):
+            moves = board.get_legal_moves(color)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            color = "black" if color == "red" else "red"
+        moves = board.get_legal_moves(color)
+        if moves:
+            positions.append((board.get_state(color).copy(), moves))
+    return positions
+
+def evaluate(model, positions, batch_size=64):
+    priors, values = [], []
+    seconds = 0.0
+    for start in range(0, len(positions), batch_size):
+        batch = positions[start:start + batch_size]
+        mask = np.zeros((len(batch), NUM_MOVES), dtype=bool)
+        for i, (_, moves) in enumerate(batch):
+            mask[i, [policy_index(move) for move in moves]] = True
+        inputs = mx.concatenate([encode_state(planes) for planes, _ in batch])
+        legal_mask = mx.array(mask)
+        if start == 0:
+            mx.eval(model.predict(inputs, legal_mask))  # Compile outside the timing
+        began = time.perf_counter()
+        batch_priors, batch_values = model.predict(inputs, legal_mask)
+        mx.eval(batch_priors, batch_values)
+        seconds += time.perf_counter() - began
+        priors.append(np.array(batch_priors))
+        values.append(np.array(batch_values).reshape(-1))
+    return np.concatenate(priors), np.concatenate(values), seconds
+
+def accuracy_report(reference, candidate, positions):
+    # Policy and value agreement of `candidate` with `reference` on the positions
+    ref_priors, ref_values, ref_seconds = evaluate(reference, positions)
+    priors, values, seconds = evaluate(candidate, positions)
+    legal = ref_priors > 0
+    kl = np.where(legal, ref_priors * (np.log(np.where(legal, ref_priors, 1)) - np.log(np.maximum(priors, 1e-12))), 0)
+    return {
+        "positions": len(positions),
+        "top1_agreement": float(np.mean(ref_priors.argmax(axis=1) == priors.argmax(axis=1))),
+        "policy_kl_mean": float(kl.sum(axis=1).mean()),
+        "prior_abs_error_max": float(np.abs(ref_priors - priors).max()),
+        "value_abs_error_mean": float(np.abs(ref_values - values).mean()),
+        "value_abs_error_max": float(np.abs(ref_values - values).max()),
+        "weight_bytes_fp32": weight_bytes(reference),
+        "weight_bytes": weight_bytes(candidate),
+        "eval_ms_fp32": ref_seconds / len(positions) * 1000,
+        "eval_ms": seconds / len(positions) * 1000,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize a ChessNet checkpoint and report its accuracy")
+    parser.add_argument("checkpoint", help="float32 checkpoint to convert")
+    parser.add_argument("--mode", choices=("int8", "fp16"), default="int8")
+    parser.add_argument("--output", help="default: <checkpoint>_<mode>.safetensors")
+    parser.add_argument("--positions", type=int, default=512, help="held-out positions for the report")
+    parser.add_argument("--seed", type=int, default=12345)
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.checkpoint)[0] + f"_{args.mode}.safetensors"
+    quantize_checkpoint(args.checkpoint, output, args.mode)
+    print(f"Wrote {args.mode} weights to {output}")
+    report = accuracy_report(ChessNet.load(args.checkpoint), ChessNet.load(output),
+                             held_out_positions(args.positions, args.seed))
+    for name, value in report.items():
+        print(f"  {name}: {value:.6f}" if isinstance(value, float) else f"  {name}: {value}")
+
+if __name__ == "__main__":
+    main()
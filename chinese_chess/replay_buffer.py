@@ -0,0 +1,167 @@
+import json
+import os
+import numpy as np
+from ai import game_positions
+from chess_board import NUM_PLANES
+from move_encoding import NUM_MOVES
+
+POLICY_SIZE = NUM_MOVES
+# Sparse policy slots per record; positions with more visited moves keep the most visited
+POLICY_ENTRIES = 128
+
+
+def record_dtype(plane_shape, policy_entries=POLICY_ENTRIES):
+    return np.dtype([
+        ("planes", np.int8, tuple(plane_shape)),
+        ("policy_count", np.uint16),
+        ("policy_index", np.uint16, (policy_entries,)),
+        ("policy_visits", np.uint16, (policy_entries,)),
+        ("value", np.float32),
+    ])
+
+
+def fill_record(record, planes, policy_indices, visits, value):
+    entries = len(record["policy_index"])
+    if len(policy_indices) > entries:
+        top = np.argsort(visits)[::-1][:entries]
+        policy_indices = np.asarray(policy_indices)[top]
+        visits = np.asarray(visits)[top]
+    count = len(policy_indices)
+    record["planes"] = planes
+    record["policy_count"] = count
+    record["policy_index"][:count] = policy_indices
+    record["policy_index"][count:] = 0
+    record["policy_visits"][:count] = np.minimum(visits, 0xFFFF)
+    record["policy_visits"][count:] = 0
+    record["value"] = value
+
+
+class ReplayBuffer:
+    # Training positions on disk as fixed-size records in append-only .npy shards.
+    # Shards are memory-mapped, so sampling reads only the records it touches; once
+    # shards would hold more than `capacity` positions the oldest ones are deleted.
+    # A new buffer's shards hold at most half of `capacity`, so evicting the oldest
+    # shard never empties it.
+    def __init__(self, directory="replay", capacity=1 << 20, shard_size=1 << 16, plane_shape=(NUM_PLANES, 10, 9)):
+        self.directory = directory
+        self.capacity = capacity
+        shard_size = max(1, min(shard_size, capacity // 2))
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, "index.json")
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {"plane_shape": list(plane_shape), "policy_size": POLICY_SIZE,
+                          "policy_entries": POLICY_ENTRIES, "shard_size": shard_size, "next_shard": 0, "shards": []}
+        # Buffers written before the dense move index indexed the 8,100 (from, to) pairs
+        policy_size = self.index.get("policy_size", 9 * 10 * 9 * 10)
+        if policy_size != POLICY_SIZE:
+            raise ValueError(f"Replay buffer in {directory} indexes {policy_size} moves, expected {POLICY_SIZE}")
+        if tuple(self.index["plane_shape"]) != tuple(plane_shape):
+            raise ValueError(f"Replay buffer in {directory} holds {tuple(self.index['plane_shape'])} planes, "
+                             f"expected {tuple(plane_shape)}")
+        self.dtype = record_dtype(self.index["plane_shape"], self.index["policy_entries"])
+        self.shard_size = self.index["shard_size"]
+        self.readers = {}
+        self.writer = None
+        # Evicted shard files, deleted once the index no longer names them
+        self.evicted = []
+
+    def __len__(self):
+        return sum(shard["count"] for shard in self.index["shards"])
+
+    def shard_path(self, shard):
+        return os.path.join(self.directory, shard["name"])
+
+    def add(self, planes, policy_indices, visits, value):
+        shards = self.index["shards"]
+        if not shards or shards[-1]["count"] == self.shard_size:
+            self.new_shard()
+        shard = shards[-1]
+        if self.writer is None:
+            self.writer = np.load(self.shard_path(shard), mmap_mode="r+")
+        fill_record(self.writer[shard["count"]], planes, policy_indices, visits, value)
+        shard["count"] += 1
+
+    def add_game(self, game):
+        # Appends every position of a self-play record and commits the index
+        for planes, policy_indices, visits, value in game_positions(game):
+            self.add(planes, policy_indices, visits, value)
+        self.flush()
+
+    def new_shard(self):
+        self.close_writer()
+        name = f"shard_{self.index['next_shard']:06d}.npy"
+        self.index["next_shard"] += 1
+        np.lib.format.open_memmap(os.path.join(self.directory, name), mode="w+", dtype=self.dtype,
+                                  shape=(self.shard_size,)).flush()
+        self.index["shards"].append({"name": name, "count": 0})
+        self.evict()
+
+    def evict(self):
+        # Oldest first, whole shards, never the one being written; counts allocated
+        # records so the disk use stays within the cap as well
+        shards = self.index["shards"]
+        while len(shards) > 1 and len(shards) * self.shard_size > self.capacity:
+            shard = shards.pop(0)
+            self.readers.pop(shard["name"], None)
+            self.evicted.append(self.shard_path(shard))
+
+    def close_writer(self):
+        if self.writer is not None:
+            self.writer.flush()
+            self.writer = None
+
+    def flush(self):
+        # Records become visible to other processes once the index names them
+        if self.writer is not None:
+            self.writer.flush()
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.index, f)
+        os.replace(temporary, self.index_path)
+        # Only now that the index on disk has stopped naming them
+        for path in self.evicted:
+            os.remove(path)
+        self.evicted = []
+
+    def reader(self, shard):
+        records = self.readers.get(shard["name"])
+        if records is None:
+            records = np.load(self.shard_path(shard), mmap_mode="r")
+            self.readers[shard["name"]] = records
+        return records
+
+    def sample(self, batch_size, rng=None):
+        # Uniform over all stored positions; returns a structured array of records
+        rng = rng if rng is not None else np.random.default_rng()
+        shards = [shard for shard in self.index["shards"] if shard["count"]]
+        counts = np.array([shard["count"] for shard in shards])
+        if not counts.sum():
+            raise ValueError("Replay buffer is empty")
+        positions = np.sort(rng.integers(0, counts.sum(), batch_size))
+        bounds = np.cumsum(counts)
+        which = np.searchsorted(bounds, positions, side="right")
+        batch = np.empty(batch_size, dtype=self.dtype)
+        for i in np.unique(which):
+            selected = which == i
+            offsets = positions[selected] - (bounds[i] - counts[i])
+            batch[selected] = self.reader(shards[i])[offsets]
+        return batch
+
+    def stats(self):
+        return {
+            "positions": len(self),
+            "shards": len(self.index["shards"]),
+            "record_bytes": self.dtype.itemsize,
+            "disk_bytes": len(self.index["shards"]) * self.shard_size * self.dtype.itemsize,
+        }
+
+
+def dense_policy(batch):
+    # Visit counts of sampled records as normalised (batch, POLICY_SIZE) targets
+    targets = np.zeros((len(batch), POLICY_SIZE), dtype=np.float32)
+    rows = np.repeat(np.arange(len(batch)), batch["policy_index"].shape[1])
+    np.add.at(targets, (rows, batch["policy_index"].reshape(-1)), batch["policy_visits"].reshape(-1))
+    return targets / np.maximum(targets.sum(axis=1, keepdims=True), 1)
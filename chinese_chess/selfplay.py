@@ -0,0 +1,102 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from chess_board import ChessBoard
+from ai import ChessNet, MCTS, policy_move, run_search
+from replay_buffer import ReplayBuffer
+from checkpoint import latest_checkpoint
+
+# Threads per worker for the numeric libraries; the pool supplies the parallelism
+WORKER_THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+_worker = {}
+
+def play_game(mcts, seed, max_plies=200, temperature_moves=20):
+    return run_search(mcts.model, self_play_game(mcts, seed, max_plies, temperature_moves))
+
+def self_play_game(mcts, seed, max_plies=200, temperature_moves=20):
+    # Plays one game against itself. For the first `temperature_moves` plies the move
+    # is sampled in proportion to root visits so parallel games diverge.
+    # Generator like MCTS.search: yields leaf batches and returns the game record.
+    rng = random.Random(seed)
+    board = ChessBoard()
+    mcts.reset()
+    color = "red"
+    record = {"seed": seed, "moves": [], "policies": [], "winner": None}
+    while len(record["moves"]) < max_plies:
+        action = yield from mcts.search(board, color)
+        if action is None:
+            record["winner"] = "black" if color == "red" else "red"
+            break
+        policy_indices, visits = mcts.last_visits
+        # With no root visits (a budget spent expanding the root) keep the search's move
+        if len(record["moves"]) < temperature_moves and sum(visits):
+            action = policy_move(rng.choices(policy_indices, weights=visits)[0])
+        record["moves"].append(action)
+        record["policies"].append((policy_indices, visits))
+        board.push(action)
+        color = "black" if color == "red" else "red"
+    record["plies"] = len(record["moves"])
+    return record
+
+def _init_worker(checkpoint, mcts_options, game_options):
+    model = ChessNet.load(checkpoint) if checkpoint else ChessNet()
+    _worker["mcts"] = MCTS(model, verbose=False, **mcts_options)
+    _worker["game_options"] = game_options
+
+def _play_worker_game(seed):
+    start = time.perf_counter()
+    record = play_game(_worker["mcts"], seed, **_worker["game_options"])
+    record["seconds"] = time.perf_counter() - start
+    record["worker"] = os.getpid()
+    return record
+
+def run_self_play(num_games, workers=None, checkpoint=None, mcts_options=None, game_options=None, seed=0):
+    # Yields finished game records as soon as any worker completes one
+    workers = workers or os.cpu_count()
+    for name in WORKER_THREAD_VARIABLES:
+        os.environ.setdefault(name, "1")
+    # Spawned workers start clean instead of inheriting a forked MLX/BLAS runtime
+    context = multiprocessing.get_context("spawn")
+    initargs = (checkpoint, mcts_options or {}, game_options or {})
+    with context.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        seeds = range(seed, seed + num_games)
+        for record in pool.imap_unordered(_play_worker_game, seeds):
+            yield record
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate self-play games in parallel worker processes")
+    parser.add_argument("--games", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--checkpoint", help="weights to load (default: newest version of --name in models/)")
+    parser.add_argument("--name", default="model", help="checkpoint name, as saved by train.py")
+    parser.add_argument("--simulations", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-plies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="selfplay_games.jsonl", help="finished games are appended here")
+    parser.add_argument("--replay-dir", help="also append the positions to this replay buffer")
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or latest_checkpoint(args.name)
+    print(f"Self-play: {args.games} games on {args.workers} workers, weights: {checkpoint or 'random'}")
+    replay_buffer = ReplayBuffer(args.replay_dir) if args.replay_dir else None
+    start = time.perf_counter()
+    with open(args.output, "a") as output:
+        for count, record in enumerate(run_self_play(
+                args.games, args.workers, checkpoint,
+                mcts_options={"num_simulations": args.simulations, "batch_size": args.batch_size},
+                game_options={"max_plies": args.max_plies}, seed=args.seed), start=1):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            if replay_buffer is not None:
+                replay_buffer.add_game(record)
+            elapsed = time.perf_counter() - start
+            print(f"[{count}/{args.games}] seed {record['seed']}: {record['plies']} plies, "
+                  f"winner {record['winner']}, {count / elapsed * 3600:.1f} games/hour")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import json
+import time
+from collections import deque
+import numpy as np
+from ai import ChessNet, MCTS, evaluate_batch
+from evaluation_cache import EvaluationCache
+from selfplay import self_play_game
+from checkpoint import latest_checkpoint
+
+class SelfPlayScheduler:
+    # Runs many self-play games in one process. Each game is a coroutine
+    # (selfplay.self_play_game); the leaves they wait on go into one shared queue
+    # that is drained by a single ChessNet forward pass per `batch_size` leaves.
+    def __init__(self, model, concurrent_games=32, batch_size=64, max_wait=0.01, mcts_options=None,
+                 game_options=None):
+        self.model = model
+        self.concurrent_games = concurrent_games
+        self.batch_size = batch_size
+        # Longest a queued leaf waits for the batch to fill while games can still add to it
+        self.max_wait = max_wait
+        self.mcts_options = dict(mcts_options or {})
+        # Every game keeps its own tree, so keep each one small
+        self.mcts_options.setdefault("max_nodes", 1 << 16)
+        self.game_options = game_options or {}
+        # All games use the same weights and can share network results
+        self.evaluation_cache = EvaluationCache()
+        self.queue = deque()
+        self.ready = deque()
+        self.batch_sizes = []
+        self.latencies = []
+        self.forward_seconds = 0.0
+
+    def run(self, num_games, seed=0):
+        # Yields game records as games finish
+        seeds = iter(range(seed, seed + num_games))
+        idle = []
+        active = 0
+        for game_seed in seeds:
+            self.start_game(game_seed, idle)
+            active += 1
+            if active == self.concurrent_games:
+                break
+
+        while active:
+            while self.ready:
+                game, results = self.ready.popleft()
+                try:
+                    pending = game["coroutine"].send(results)
+                except StopIteration as stop:
+                    yield stop.value
+                    active -= 1
+                    idle.append(game["mcts"])
+                    game_seed = next(seeds, None)
+                    if game_seed is not None:
+                        self.start_game(game_seed, idle)
+                        active += 1
+                    continue
+                self.enqueue(game, pending)
+                while len(self.queue) >= self.batch_size or \
+                        (self.queue and time.perf_counter() - self.queue[0][3] >= self.max_wait):
+                    self.flush()
+            if self.queue:
+                # Every game is waiting on the network: evaluate what is queued
+                self.flush()
+
+    def start_game(self, game_seed, idle):
+        # Searches of finished games are reused, their trees are reset by the game
+        mcts = idle.pop() if idle else MCTS(self.model, evaluation_cache=self.evaluation_cache, verbose=False,
+                                            **self.mcts_options)
+        game = {"mcts": mcts, "coroutine": self_play_game(mcts, game_seed, **self.game_options)}
+        self.ready.append((game, None))
+
+    def enqueue(self, game, pending):
+        game["priors"] = [None] * len(pending)
+        game["values"] = [None] * len(pending)
+        game["remaining"] = len(pending)
+        now = time.perf_counter()
+        for i, leaf in enumerate(pending):
+            self.queue.append((game, i, leaf, now))
+
+    def flush(self):
+        batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+        start = time.perf_counter()
+        priors, values = evaluate_batch(self.model, [leaf for _, _, leaf, _ in batch])
+        now = time.perf_counter()
+        self.forward_seconds += now - start
+        self.batch_sizes.append(len(batch))
+        for (game, i, _, enqueued), leaf_priors, leaf_value in zip(batch, priors, values):
+            self.latencies.append(now - enqueued)
+            game["priors"][i] = leaf_priors
+            game["values"][i] = leaf_value
+            game["remaining"] -= 1
+            if game["remaining"] == 0:
+                self.ready.append((game, (game["priors"], game["values"])))
+
+    def stats(self):
+        if not self.batch_sizes:
+            return {"batches": 0, "positions": 0}
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "batches": len(self.batch_sizes),
+            "positions": len(self.latencies),
+            "batch_fill": sum(self.batch_sizes) / (len(self.batch_sizes) * self.batch_size),
+            "full_batches": sum(size == self.batch_size for size in self.batch_sizes) / len(self.batch_sizes),
+            "queue_latency_ms_mean": float(latencies.mean()),
+            "queue_latency_ms_p95": float(np.percentile(latencies, 95)),
+            "forward_seconds": self.forward_seconds,
+            "positions_per_second": len(self.latencies) / max(self.forward_seconds, 1e-9),
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many self-play games in one process with batched evaluation")
+    parser.add_argument("--games", type=int, default=64)
+    parser.add_argument("--concurrent-games", type=int, default=32)
+    parser.add_argument("--eval-batch-size", type=int, default=64, help="leaves per forward pass")
+    parser.add_argument("--max-wait", type=float, default=0.01, help="seconds a leaf may wait for a fuller batch")
+    parser.add_argument("--checkpoint", help="weights to load (default: newest version of --name in models/)")
+    parser.add_argument("--name", default="model", help="checkpoint name, as saved by train.py")
+    parser.add_argument("--simulations", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8, help="leaves each search collects per step")
+    parser.add_argument("--max-plies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="selfplay_games.jsonl", help="finished games are appended here")
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or latest_checkpoint(args.name)
+    model = ChessNet.load(checkpoint) if checkpoint else ChessNet()
+    scheduler = SelfPlayScheduler(model, args.concurrent_games, args.eval_batch_size, args.max_wait,
+                                  mcts_options={"num_simulations": args.simulations, "batch_size": args.batch_size},
+                                  game_options={"max_plies": args.max_plies})
+    start = time.perf_counter()
+    count = 0
+    with open(args.output, "a") as output:
+        for count, record in enumerate(scheduler.run(args.games, args.seed), start=1):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            print(f"[{count}/{args.games}] seed {record['seed']}: {record['plies']} plies, winner {record['winner']}")
+    stats = scheduler.stats()
+    print(f"{count / (time.perf_counter() - start) * 3600:.1f} games/hour")
+    for name, value in stats.items():
+        print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import time
+from ai import ChessNet, MCTS, train_network, create_optimizer
+from data_loader import MinibatchLoader
+from selfplay import play_game, run_self_play
+from checkpoint import CheckpointManager
+from selfplay_scheduler import SelfPlayScheduler
+from replay_buffer import ReplayBuffer
+
+# Headless self-play and training loop: no pygame, no drawing, no delays between moves
+
+def generate_games(model, checkpoint, args, iteration):
+    mcts_options = {"num_simulations": args.simulations, "batch_size": args.batch_size}
+    game_options = {"max_plies": args.max_plies}
+    seed = args.seed + iteration * args.games
+    if args.workers > 1:
+        # Workers load their weights from the checkpoint written after the last iteration
+        return run_self_play(args.games, args.workers, checkpoint, mcts_options, game_options, seed)
+    if args.concurrent_games > 1:
+        scheduler = SelfPlayScheduler(model, args.concurrent_games, args.eval_batch_size,
+                                      mcts_options=mcts_options, game_options=game_options)
+        return scheduler.run(args.games, seed)
+    mcts = MCTS(model, verbose=False, **mcts_options)
+    return (play_game(mcts, seed + i, **game_options) for i in range(args.games))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless self-play and training")
+    parser.add_argument("--iterations", type=int, default=1, help="self-play/train rounds, 0 runs forever")
+    parser.add_argument("--games", type=int, default=10, help="games per iteration")
+    parser.add_argument("--workers", type=int, default=1, help="self-play processes, 1 plays in this process")
+    parser.add_argument("--concurrent-games", type=int, default=1,
+                        help="games interleaved in this process with pooled network evaluation")
+    parser.add_argument("--eval-batch-size", type=int, default=64, help="leaves per forward pass when interleaving")
+    parser.add_argument("--simulations", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-plies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--channels", type=int, default=48, help="tower width of a new network")
+    parser.add_argument("--blocks", type=int, default=4, help="residual blocks of a new network")
+    parser.add_argument("--checkpoint", help="weights to start from (default: newest version of --name)")
+    parser.add_argument("--checkpoint-dir", default="models", help="versioned checkpoints are written here")
+    parser.add_argument("--name", default="model", help="checkpoint name, saved as <name>_<version>.safetensors")
+    parser.add_argument("--keep", type=int, default=5, help="checkpoint versions to keep, at least 1")
+    parser.add_argument("--replay-dir", default="replay", help="replay buffer the games are appended to")
+    parser.add_argument("--train-steps", type=int, default=100, help="minibatches per iteration")
+    parser.add_argument("--train-batch-size", type=int, default=256)
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--replay-capacity", type=int, default=1 << 20, help="positions kept before the oldest go")
+    args = parser.parse_args(argv)
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+
+    checkpoints = CheckpointManager(args.checkpoint_dir, args.keep)
+    checkpoint = args.checkpoint or checkpoints.latest(args.name)
+    model = ChessNet.load(checkpoint) if checkpoint else ChessNet(args.channels, args.blocks)
+    print(f"Starting from {checkpoint or 'random weights'}: {model.channels} channels, {model.blocks} blocks, "
+          f"{model.parameter_count():,} parameters")
+    # Self-play workers load their weights from disk, so a fresh network is saved first
+    saving = None if checkpoint else checkpoints.save(model, args.name)
+    replay_buffer = ReplayBuffer(args.replay_dir, args.replay_capacity)
+    optimizer = create_optimizer(args.learning_rate)
+
+    iteration = 0
+    while args.iterations == 0 or iteration < args.iterations:
+        start = time.perf_counter()
+        if saving is not None and args.workers > 1:
+            checkpoint = saving.result()
+        for count, record in enumerate(generate_games(model, checkpoint, args, iteration), start=1):
+            replay_buffer.add_game(record)
+            print(f"Game {count}/{args.games}: {len(record['moves'])} plies, winner {record['winner']}")
+        played = time.perf_counter()
+        # Samples the whole buffer, so earlier iterations and sessions are trained on too
+        batches = MinibatchLoader(replay_buffer, args.train_batch_size, args.train_steps, seed=args.seed + iteration)
+        loss = train_network(model, optimizer, batches)
+        # Written in the background while the next round of self-play starts
+        saving = checkpoints.save(model, args.name, {"iteration": str(iteration + 1)})
+        iteration += 1
+        # No loss to report when --train-steps is 0
+        loss_text = f" (loss {loss:.4f})" if loss is not None else ""
+        print(f"Iteration {iteration}: self-play {played - start:.1f}s, "
+              f"training {time.perf_counter() - played:.1f}s{loss_text}")
+    checkpoints.close()
+    print(f"Saved {checkpoints.latest(args.name)}")
+
+if __name__ == "__main__":
+    main()
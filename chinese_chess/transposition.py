@@ -0,0 +1,70 @@
+import sys
+
+
+class TranspositionTable:
+    def __init__(self, max_entries=1 << 18):
+        size = 1
+        while size < max_entries:
+            size <<= 1
+        self.size = size
+        self.mask = size - 1
+        # Each slot holds (key, value, depth, generation) or None
+        self.slots = [None] * size
+        self.generation = 0
+        self.count = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.replacements = 0
+        self.rejected = 0
+
+    def new_search(self):
+        # Entries from earlier searches become preferred victims
+        self.generation += 1
+
+    def probe(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def store(self, key, value, depth=0):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is None:
+            self.count += 1
+        elif entry[0] != key:
+            # Depth-preferred replacement, but stale entries always give way
+            if entry[3] == self.generation and depth < entry[2]:
+                self.rejected += 1
+                return False
+            self.replacements += 1
+        self.slots[index] = (key, value, depth, self.generation)
+        self.stores += 1
+        return True
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.count = 0
+
+    def memory_bytes(self):
+        # Slot array plus entry tuples; stored values are not counted
+        entry_bytes = sys.getsizeof((0, None, 0, 0)) + 2 * sys.getsizeof(1 << 63)
+        return sys.getsizeof(self.slots) + self.count * entry_bytes
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "size": self.size,
+            "entries": self.count,
+            "fill": self.count / self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "rejected": self.rejected,
+            "memory_bytes": self.memory_bytes(),
+        }
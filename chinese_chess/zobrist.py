@@ -0,0 +1,8 @@
+import random
+
+# Fixed seed so keys agree between processes and across runs
+_rng = random.Random(0x5A0B1257)
+
+# PIECE_KEYS[mailbox value + 7][square] for mailbox values -7..7 (0 unused)
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(90)] for _ in range(15)]
+BLACK_TO_MOVE_KEY = _rng.getrandbits(64)